@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Library General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright (C) 2018 Branson Matheson
+
+'''
+per-frame cost of the whole handler, in each mode.
+
+Builds the configured show, stage and DmxHandler with the replay
+stand-ins for olad and the joystick (no olad or xboxdrv needed),
+then feeds it a console frame and a moving stick every frame and
+runs tick() as the scheduler would.  For passthrough, scene run,
+scene edit and stage edit it reports frames/sec, the p50/p99/max
+time of a frame, and what a frame allocates: the peak Python memory
+above where it started and the blocks still held afterwards.
+
+    python bench/handler.py -f 5000
+    python bench/handler.py -m scene_run -m stage_edit
+
+Nothing is saved: no button is pressed, so scenes and stages are
+only changed in memory.
+'''
+
+import argparse
+import array
+import gc
+import logging as log
+import os
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from lib.config import DFSConfig
+from lib.config import UNIVERSE_SIZE
+from lib.handler import (DmxHandler, OP_PROD, OP_TECH, MODE_PASSTHRU,
+                         MODE_SCENE_RUN, MODE_SCENE_EDIT, MODE_STAGE_EDIT)
+from lib.joystate import JoyState, DEADZONE
+from lib.replay import ReplayClient, ReplayJoystick
+from lib.show import Show
+from lib.stage import Stage
+
+# name -> operation, mode
+MODES = (
+    ('passthrough', OP_PROD, MODE_PASSTHRU),
+    ('scene_run', OP_PROD, MODE_SCENE_RUN),
+    ('scene_edit', OP_TECH, MODE_SCENE_EDIT),
+    ('stage_edit', OP_TECH, MODE_STAGE_EDIT),
+)
+
+# the stick swings back and forth over this many frames so targets
+# move every frame without running off the stage
+SWING = 64
+
+
+class Bench:
+    ''' a handler in one mode, driven a frame at a time '''
+
+    def __init__(self, config, show_name, stage_name, scene, op, mode):
+        config.output.backend = 'ola'
+        self.show = Show(config, show_name)
+        self.stage = Stage(self.show, stage_name)
+        self.joy = ReplayJoystick(
+            config.joystick.get('deadzone', DEADZONE))
+        self.client = ReplayClient()
+        self.handler = DmxHandler(
+            config, self.show, self.stage, self.joy, self.client)
+
+        # a console frame with everything at half, and one channel
+        # fading so passthrough has something to send
+        self.dmx = array.array('B', [128] * UNIVERSE_SIZE)
+        control = config.input.id - 1
+        self.dmx[control] = op
+        self.dmx[control + 1] = mode
+        self.dmx[control + 2] = scene
+        self.fade = 0 if control else 3
+        self.frame = 0
+        self.sticks = [JoyState.make(
+            (axis, -axis, axis, -axis), (0, 0), 0, self.joy.deadzone)
+            for axis in (24000, -24000)]
+
+    def step(self):
+        ''' one console frame, one stick reading and one tick '''
+        self.frame += 1
+        self.dmx[self.fade] = self.frame & 0xff
+        self.joy.set(self.sticks[self.frame // SWING % 2])
+        self.handler.handle(self.dmx)
+        self.handler.tick()
+
+
+def percentile(values, pct):
+    ''' the pct percentile of sorted values '''
+    index = min(len(values) - 1, int(len(values) * pct / 100.0))
+    return values[index]
+
+
+def measure(bench, frames, warmup):
+    for _ in range(warmup):
+        bench.step()
+
+    # timing, with the collector off so a collection doesn't land
+    # on one frame and hide in p99
+    gc.collect()
+    gc.disable()
+    times = list()
+    clock = time.perf_counter
+    try:
+        start = clock()
+        for _ in range(frames):
+            t = clock()
+            bench.step()
+            times.append(clock() - t)
+        took = clock() - start
+    finally:
+        gc.enable()
+    times.sort()
+
+    # allocations, in a separate pass as tracing slows everything
+    alloc_frames = min(frames, 500)
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    peak = 0
+    for _ in range(alloc_frames):
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        bench.step()
+        peak += tracemalloc.get_traced_memory()[1] - current
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    held = sum(s.count_diff for s in after.compare_to(before, 'lineno'))
+
+    return {
+        'fps': frames / took,
+        'p50': percentile(times, 50),
+        'p99': percentile(times, 99),
+        'max': times[-1],
+        'bytes': peak / alloc_frames,
+        'blocks': held / alloc_frames,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='benchmark DmxHandler.tick in each mode')
+    parser.add_argument('-f', '--frames', type=int, default=5000,
+                        help='frames to time per mode')
+    parser.add_argument('-w', '--warmup', type=int, default=200,
+                        help='frames to run before timing')
+    parser.add_argument('-m', '--mode', action='append',
+                        choices=[m[0] for m in MODES],
+                        help='modes to run, default all')
+    parser.add_argument('-c', '--scene', type=int, default=1,
+                        help='scene to cue in the scene modes')
+    parser.add_argument('-s', '--show-name', default='default',
+                        help='show to load')
+    parser.add_argument('-l', '--stage-name', default='default',
+                        help='stage to load')
+    args = parser.parse_args()
+
+    os.chdir(ROOT)
+    log.basicConfig(format='%(levelname)s: %(message)s',
+                    level=log.WARNING)
+    print('%-12s %9s %8s %8s %8s %10s %8s' % (
+        'mode', 'frames/s', 'p50 us', 'p99 us', 'max us',
+        'bytes/fr', 'held/fr'))
+    for name, op, mode in MODES:
+        if args.mode and name not in args.mode:
+            continue
+        bench = Bench(DFSConfig(), args.show_name, args.stage_name,
+                      args.scene, op, mode)
+        r = measure(bench, args.frames, args.warmup)
+        print('%-12s %9.0f %8.1f %8.1f %8.1f %10.0f %8.2f' % (
+            name, r['fps'], r['p50'] * 1e6, r['p99'] * 1e6,
+            r['max'] * 1e6, r['bytes'], r['blocks']))
+        bench.handler.scenes.close()
+
+
+if __name__ == '__main__':
+    main()
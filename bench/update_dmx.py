@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Library General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright (C) 2018 Branson Matheson
+
+'''
+per-frame cost of writing a rig of fixtures into a universe.
+
+Builds a show of N fixtures from the configured profiles, spread
+across as many universes as needed, and times
+FixtureGroup.update_dmx() with every fixture dirty (a full rewrite,
+as after a new console frame) and with nothing dirty (steady state).
+
+    python bench/update_dmx.py -n 120
+'''
+
+import argparse
+import array
+import os
+import sys
+import tempfile
+import time
+
+import yaml
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from lib.config import DFSConfig
+from lib.config import UNIVERSE_SIZE
+from lib.show import Show
+
+
+def rig(config, count):
+    '''
+    a show with count fixtures cycling through the profiles, packed
+    into universes from the configured output up.
+    '''
+    names = sorted(config.fixture_profiles.keys())
+    fixtures = dict()
+    universe = config.output.universe
+    dmx_id = 1
+    for i in range(count):
+        profile = names[i % len(names)]
+        size = len(config.fixture_profiles[profile]['channels'])
+        if dmx_id + size - 1 > UNIVERSE_SIZE:
+            universe += 1
+            dmx_id = 1
+        fixtures['F%03d' % i] = {
+            'id': dmx_id,
+            'universe': universe,
+            'profile': profile,
+            'aspect': 'truss',
+            'x': i % 30 * 10,
+            'y': 216,
+            'z': 77,
+        }
+        dmx_id += size
+    return {'shows': {'bench': {
+        'stage': {'x': 300, 'y': 230, 'z': 65},
+        'fixtures': fixtures,
+        'fixture_aspects': {'truss': 'hanging'},
+    }}}
+
+
+def timed(fn, frames):
+    ''' seconds per call of fn over frames calls '''
+    start = time.perf_counter()
+    for _ in range(frames):
+        fn()
+    return (time.perf_counter() - start) / frames
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='benchmark Fixture.update_dmx')
+    parser.add_argument('-n', '--fixtures', type=int, default=120,
+                        help='fixtures in the rig')
+    parser.add_argument('-f', '--frames', type=int, default=2000,
+                        help='frames to time')
+    args = parser.parse_args()
+
+    os.chdir(ROOT)
+    config = DFSConfig()
+    with tempfile.NamedTemporaryFile('w', suffix='.yml') as f:
+        yaml.dump(rig(config, args.fixtures), f)
+        f.flush()
+        show = Show(config, 'bench', f.name)
+    group = show.group('all')
+    channels = sum(len(g.channels) for g in group.fixtures.values())
+    out = memoryview(array.array(
+        'B', bytes(len(show.universes) * UNIVERSE_SIZE)))
+
+    def full():
+        group.invalidate()
+        group.update_dmx(out)
+
+    def steady():
+        group.update_dmx(out)
+
+    for name, fn in (('full rewrite', full), ('steady state', steady)):
+        per = timed(fn, args.frames)
+        print('%-13s %4d fixtures %5d channels %2d universes: '
+              '%8.1f us/frame' % (
+                  name, len(group.fixtures), channels,
+                  len(show.universes), per * 1e6))
+
+
+if __name__ == '__main__':
+    main()
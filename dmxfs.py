@@ -20,6 +20,7 @@ from __future__ import print_function
 
 import argparse
 import atexit
+import functools
 import os
 import signal
 import sys
@@ -30,17 +31,34 @@ from ola.ClientWrapper import ClientWrapper
 # Add the project root to Python path for lib imports
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
+from lib.cache import SnapshotCache
 from lib.config import DFSConfig
 from lib.handler import DmxHandler
-from lib.show import Show
+from lib.joystate import DEADZONE
+from lib.joystick import open_joystick
+from lib.listener import open_input
+from lib.metrics import Metrics, open_metrics
+from lib.recording import Recorder
+from lib.reload import ShowReloader, RELOAD_INTERVAL
+from lib.replay import (
+    Replay, ReplayClient, ReplayClock, ReplayJoystick, ReplayWriter)
+from lib.scheduler import FrameScheduler
+from lib.show import SceneIndex, Show
 from lib.stage import Stage
-from lib import xbox
+from lib.trace import tracer, TRACE_DIR, TRACE_SIZE
 
 
 __author__ = 'branson@sandsite.org'
 
 # Global variables for graceful shutdown
 wrapper = None
+listener = None
+scheduler = None
+handler = None
+reloader = None
+recorder = None
+replay = None
+metrics_server = None
 joy = None
 shutdown_requested = False
 
@@ -52,18 +70,40 @@ def killall():
 
 def signal_handler(signum, frame):
     ''' Handle termination signals gracefully '''
-    global shutdown_requested, wrapper, joy
-
     log.info(f'Received signal {signum}, initiating graceful shutdown...')
+    shutdown()
+
+
+def shutdown():
+    ''' stop everything, log what it did and exit '''
+    global shutdown_requested, wrapper, listener, scheduler, handler, \
+        reloader, recorder, replay, metrics_server, joy
+
     shutdown_requested = True
 
-    # Stop the OLA wrapper if it's running
-    if wrapper:
-        try:
-            wrapper.Stop()
-            log.info('OLA wrapper stopped')
-        except Exception as e:
-            log.error(f'Error stopping OLA wrapper: {e}')
+    # Stop the output loop if it's running
+    if scheduler:
+        scheduler.stop()
+        log.info('output stopped: %s' % scheduler.stats())
+    if metrics_server:
+        metrics_server.stop()
+    if replay:
+        replay.stop()
+        log.info('replay: %s' % replay.stats())
+    if reloader:
+        reloader.stop()
+        log.info('reload: %s' % reloader.stats())
+    if handler:
+        log.info('input: %s' % handler.stats())
+        log.info('output backend: %s' % handler.out.stats())
+        handler.scenes.close()
+        log.info('scenes: %s' % handler.scenes.writer.stats())
+    if listener:
+        log.info('input backend: %s' % listener.stats())
+    if recorder:
+        recorder.close()
+        log.info('recorded %d records to %s' % (
+            recorder.records, recorder.path))
 
     # Close joystick connection
     if joy:
@@ -79,6 +119,11 @@ def signal_handler(signum, frame):
     sys.exit(0)
 
 
+def dump_trace(signum, frame):
+    ''' write the trace ring to disk and carry on '''
+    tracer.dump(reason='signal')
+
+
 def setup_logging(args):
     '''setup global logging and send a start entry'''
     global debug, verbose
@@ -115,6 +160,16 @@ def parse_args():
                         help="Show debugging output.")
     parser.add_argument("-c", "--check-mode", action="store_true",
                         help="check config files for readability")
+    parser.add_argument("-n", "--no-cache", action="store_true",
+                        help="always parse config, ignore the cache")
+    parser.add_argument("-r", "--record", metavar="FILE",
+                        help="record input and joystick to FILE")
+    parser.add_argument("-p", "--replay", metavar="FILE",
+                        help="run a recording instead of olad and xboxdrv")
+    parser.add_argument("-o", "--replay-output", metavar="FILE",
+                        help="record the output of a replay to FILE")
+    parser.add_argument("-m", "--max-speed", action="store_true",
+                        help="replay as fast as possible, not in real time")
 
     parser.add_argument("-l", "--stage-name",
                         default='default',
@@ -127,22 +182,27 @@ def parse_args():
 
 
 def main():
-    global wrapper, joy, shutdown_requested
+    global wrapper, listener, scheduler, handler, reloader, recorder, \
+        replay, metrics_server, joy, shutdown_requested
 
     # Register signal handlers for graceful shutdown
     signal.signal(signal.SIGTERM, signal_handler)
     signal.signal(signal.SIGINT, signal_handler)
+    signal.signal(signal.SIGUSR1, dump_trace)
     atexit.register(killall)
 
     args = parse_args()
     setup_logging(args)
     log.info('DMX Followspot starting up...')
 
-    # read tool config
-    config = DFSConfig()
+    # read tool config, compiled config is cached between runs
+    cache = None if args.no_cache else SnapshotCache()
+    config = DFSConfig(cache=cache)
+    tracer.resize(config.trace.get('size', TRACE_SIZE))
+    tracer.directory = config.trace.get('dir', TRACE_DIR)
 
     # setup show
-    show = Show(config, args.show_name)
+    show = Show(config, args.show_name, cache=cache)
     if not show:
         print('no such show %s', args.show_name)
         sys.exit(1)
@@ -153,36 +213,104 @@ def main():
         print('could not load or create stage %s', args.stage_name)
         sys.exit(1)
 
+    if args.replay:
+        run_replay(args, config, show, stage)
+        return
+
     # setup joystick
-    joy = xbox.Joystick(
-        debug=args.debug,
-        config=config.joystick
-        )
+    joy = open_joystick(config.joystick, debug=args.debug)
 
     if args.check_mode:
         sys.exit(0)
 
-    handler = DmxHandler(config, show, stage, joy)
-
-    # setup data handler, this is our callback loop
-    # as DMX data comes in constantly
-    wrapper = ClientWrapper()
-    rx = wrapper.Client()
-    rx.RegisterUniverse(
-        config.input.universe,
-        rx.REGISTER,
-        handler.handle)
+    # one connection to olad, for input and output, serviced by
+    # the main loop so send acks are read
+    client = None
+    if 'ola' in (config.input.backend, config.output.backend):
+        wrapper = ClientWrapper()
+        client = wrapper.Client()
+
+    handler = DmxHandler(config, show, stage, joy, client)
+    if args.record:
+        recorder = Recorder(args.record)
+        handler.record(recorder)
+
+    # pick up edits to the show files without restarting
+    interval = config.reload.get('interval', RELOAD_INTERVAL)
+    if interval:
+        reloader = ShowReloader(
+            config, show, stage, handler.scenes, args.stage_name,
+            cache=cache, interval=interval)
+        handler.reloader = reloader
+
+    # setup data handler, input frames are stored as they arrive
+    # and the scheduler sends output at a fixed rate
+    scheduler = FrameScheduler(handler.tick, config.output.rate)
+    if client is not None:
+        scheduler.add_reader(client.GetSocket(), client.SocketReady)
+    if config.input.backend == 'ola':
+        for universe in handler.router.inputs:
+            client.RegisterUniverse(
+                universe,
+                client.REGISTER,
+                functools.partial(handler.handle, universe=universe))
+    else:
+        # straight from the network
+        listener = open_input(
+            config.input, handler.router.inputs, handler.handle)
+        scheduler.add_reader(listener.fileno(), listener.ready)
+
+    # timings and counters for a local scrape, served off the loop
+    metrics = Metrics()
+    handler.register(metrics)
+    scheduler.register(metrics)
+    joy.register(metrics)
+    metrics.stats('dmxfs_scenes', lambda: handler.scenes.writer.stats())
+    if reloader:
+        metrics.stats('dmxfs_reload', reloader.stats)
+    if listener:
+        metrics.stats('dmxfs_listener', listener.stats)
+    metrics_server = open_metrics(metrics, config.metrics)
+    if metrics_server:
+        metrics_server.start()
 
     log.info('DMX Followspot ready, starting main loop...')
     try:
-        wrapper.Run()
+        scheduler.run()
     except KeyboardInterrupt:
         log.info('Keyboard interrupt received')
         signal_handler(signal.SIGINT, None)
     except Exception as e:
         log.error(f'Unexpected error in main loop: {e}')
+        tracer.dump(reason='error')
         signal_handler(signal.SIGTERM, None)
 
 
+def run_replay(args, config, show, stage):
+    '''
+    drive the handler from a recording, its output is acknowledged
+    at once and written to --replay-output.  Scenes saved in the
+    recording are kept in memory, not written over data/scenes.yml.
+    '''
+    global handler, recorder, replay, joy
+
+    if args.record:
+        log.error('--record and --replay can not be used together.')
+        sys.exit(1)
+    joy = ReplayJoystick(config.joystick.get('deadzone', DEADZONE))
+    clock = ReplayClock()
+    if args.replay_output:
+        recorder = Recorder(args.replay_output, clock=clock)
+    config.output.backend = 'ola'
+    handler = DmxHandler(
+        config, show, stage, joy, ReplayClient(recorder), clock=clock,
+        scenes=SceneIndex(show, writer=ReplayWriter()))
+    replay = Replay(args.replay, handler, joy, clock,
+                    realtime=not args.max_speed)
+    replay.run()
+    log.info('replay finished')
+    shutdown()
+
+
 if __name__ == "__main__":
     main()
@@ -2,10 +2,27 @@
 DMX Followspot Library Package
 
 This package contains the core modules for the DMX Followspot application:
+- buttons: Edge-triggered joystick buttons
+- cache: Compiled config snapshots kept between runs
 - config: Configuration management
 - handler: DMX data handling
+- joystate: Decoded joystick state snapshots
+- joystick: Joystick backends, xboxdrv or evdev
+- listener: Art-Net and sACN input
+- metrics: Timing histograms and the metrics endpoint
+- motion: Stick movement integrated over time
+- output: OLA, Art-Net and sACN output backends
+- recording: Recordings of input, joystick and output
+- reload: Hot reload of edited show files
+- replay: Running the handler from a recording
+- router: Input/output universes and passthrough
 - show: Show and scene management
+- solver: Vectorized pan/tilt for fixture groups
 - stage: Stage and fixture management
+- status: Controller LED written in the background
+- table: Show-wide fixture state stored by column
+- trace: In-memory ring of trace events
+- writer: Background YAML file writer
 - xbox: Xbox controller interface
 """
 
@@ -13,15 +30,49 @@ __version__ = "1.0.0"
 __author__ = "branson@sandsite.org"
 
 # Make key classes available at package level
-from .config import DFSConfig, DMXInput, DMXOutput
+from .buttons import ButtonEvents
+from .cache import SnapshotCache
+from .config import DFSConfig, DMXInput, DMXOutput, DMXRoute
 from .handler import DmxHandler
-from .show import Show, Scene, Target, FixtureGroup, Fixture
+from .joystate import JoyState
+from .joystick import EvdevJoystick, open_joystick
+from .listener import ArtNetInput, SacnInput
+from .metrics import Histogram, Metrics, MetricsServer
+from .output import OlaOutput, ArtNetOutput, SacnOutput
+from .recording import Recorder, Recording
+from .reload import ShowReloader
+from .replay import (
+    Replay, ReplayClient, ReplayClock, ReplayJoystick, ReplayWriter)
+from .router import Router
+from .show import Show, Scene, SceneIndex, Target, FixtureGroup, Fixture
+from .solver import PanTiltSolver
 from .stage import Stage, FixturePair
+from .status import StatusLed
+from .table import FixtureTable
+from .trace import TraceBuffer, tracer
+from .writer import YamlWriter
 
 __all__ = [
-    'DFSConfig', 'DMXInput', 'DMXOutput',
+    'ButtonEvents',
+    'SnapshotCache',
+    'DFSConfig', 'DMXInput', 'DMXOutput', 'DMXRoute',
     'DmxHandler',
-    'Show', 'Scene', 'Target', 'FixtureGroup', 'Fixture',
+    'JoyState',
+    'EvdevJoystick', 'open_joystick',
+    'ArtNetInput', 'SacnInput',
+    'Histogram', 'Metrics', 'MetricsServer',
+    'OlaOutput', 'ArtNetOutput', 'SacnOutput',
+    'Recorder', 'Recording',
+    'ShowReloader',
+    'Replay', 'ReplayClient', 'ReplayClock', 'ReplayJoystick',
+    'ReplayWriter',
+    'Router',
+    'Show', 'Scene', 'SceneIndex', 'Target', 'FixtureGroup', 'Fixture',
+    'PanTiltSolver',
     'Stage', 'FixturePair',
+    'StatusLed',
+    'FixtureTable',
+    'TraceBuffer', 'tracer',
+    'YamlWriter',
     'xbox'
 ]
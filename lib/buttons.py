@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Library General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright (C) 2018 Branson Matheson
+
+import time
+
+from .joystate import BIT, BUTTONS, edges
+from .motion import MAX_STEP
+from .trace import tracer, BUTTON
+
+# minimum time (seconds) between two accepted edges on one button,
+# anything faster than this is contact bounce.
+DEBOUNCE = 0.05
+
+
+class ButtonEvents:
+    '''
+    edge-triggered view of the joystick buttons.
+
+    update() is called once per frame and diffs the joystick's state
+    against the buttons as we last accepted them, recording which went
+    down or up; pressed()/released() then answer for that frame only.
+    Buttons are bitmasks (see joystate.BUTTONS), so a frame where
+    nothing changed costs one comparison.  Bounce is filtered by
+    timestamping each accepted edge instead of sleeping, so the DMX
+    callback never stalls.  Anything that is not a button (sticks,
+    refresh, led ...) is passed straight through to the joystick, so
+    this can be handed to a Scene or Stage wherever a joystick is
+    expected.  dt is the time since the last update (at most
+    MAX_STEP), which movement is scaled by.  It is taken in whole
+    microseconds, as recordings keep time, so a replay moves exactly
+    as the show did.
+    '''
+
+    def __init__(self, joy, debounce=DEBOUNCE, clock=time.monotonic):
+        self.joy = joy
+        self.debounce = debounce
+        self.clock = clock
+        self.now = self.clock()
+        self.now_us = int(round(self.now * 1e6))
+        self.dt = 0.0
+        # accepted level of every button, and this frame's edges
+        self.held_mask = self.joy.state.buttons
+        self.pressed_mask = 0
+        self.released_mask = 0
+        # no edge seen yet, so the first one is never bounce
+        self.changed = [-self.debounce] * len(BUTTONS)
+        self.repeated = [self.now] * len(BUTTONS)
+        self.trace_ids = [tracer.name(b) for b in BUTTONS]
+
+    def __getattr__(self, name):
+        # only called for attributes we don't have
+        return getattr(self.joy, name)
+
+    def update(self, now=None):
+        '''
+        diff the joystick state and record the edges for this frame,
+        at now if the caller already read the clock
+        '''
+        if now is None:
+            now = self.clock()
+        now_us = int(round(now * 1e6))
+        self.dt = min(max(now_us - self.now_us, 0) / 1e6, MAX_STEP)
+        self.now = now
+        self.now_us = now_us
+        self.pressed_mask = self.released_mask = 0
+        buttons = self.joy.state.buttons
+        if buttons == self.held_mask:
+            return False
+        for i, edge in edges(self.held_mask, buttons):
+            if self.now - self.changed[i] < self.debounce:
+                # too soon after the last edge, bounce
+                continue
+            bit = 1 << i
+            self.held_mask ^= bit
+            self.changed[i] = self.now
+            self.repeated[i] = self.now
+            if edge == 1:
+                self.pressed_mask |= bit
+            else:
+                self.released_mask |= bit
+            tracer.record(BUTTON, self.trace_ids[i], edge)
+        return bool(self.pressed_mask or self.released_mask)
+
+    def held(self, name):
+        ''' debounced level of a button '''
+        return bool(self.held_mask & BIT[name])
+
+    def pressed(self, name, repeat=None):
+        '''
+        True on the frame a button goes down.  If repeat is given
+        (seconds) a held button fires again every repeat seconds.
+        '''
+        bit = BIT[name]
+        if self.pressed_mask & bit:
+            return True
+        if repeat and self.held_mask & bit:
+            i = bit.bit_length() - 1
+            if self.now - self.repeated[i] >= repeat:
+                self.repeated[i] = self.now
+                return True
+        return False
+
+    def released(self, name):
+        ''' True on the frame a button comes back up '''
+        return bool(self.released_mask & BIT[name])
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Library General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright (C) 2018 Branson Matheson
+
+import hashlib
+import logging as log
+import os
+import pickle
+import tempfile
+
+CACHE_DIR = 'data/cache'
+
+# bump when the layout of a compiled snapshot changes
+CACHE_VERSION = 2
+
+
+class SnapshotCache:
+    '''
+    compiled config kept on disk between runs.
+
+    Each snapshot is stored under a name with the key it was built
+    from, a hash of the source files plus anything else it depends
+    on.  load() only returns a snapshot whose key still matches, so
+    editing any source file simply rebuilds it.  The cache is only an
+    optimisation: anything unreadable is ignored and rebuilt.
+    '''
+
+    def __init__(self, directory=CACHE_DIR):
+        self.directory = directory
+
+    def key(self, paths, *extra):
+        ''' hash of the contents of paths and the extra strings '''
+        digest = hashlib.sha256(str(CACHE_VERSION).encode())
+        for path in paths:
+            digest.update(path.encode())
+            with open(path, 'rb') as stream:
+                digest.update(hashlib.sha256(stream.read()).digest())
+        for e in extra:
+            digest.update(str(e).encode())
+        return digest.hexdigest()
+
+    def path(self, name):
+        return os.path.join(self.directory, '%s.pickle' % name)
+
+    def load(self, name, key):
+        ''' the snapshot stored as name if it was built from key '''
+        path = self.path(name)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'rb') as stream:
+                stored = pickle.load(stream)
+        except Exception as e:
+            log.warning('ignoring unreadable cache %s: %s' % (path, e))
+            return None
+        if not isinstance(stored, dict) or 'data' not in stored:
+            log.warning('ignoring unreadable cache %s: not a snapshot' %
+                        path)
+            return None
+        if stored.get('key') != key:
+            log.info('cache %s is stale, rebuilding.' % path)
+            return None
+        log.info('using cached %s' % path)
+        return stored['data']
+
+    def store(self, name, key, data):
+        ''' save a snapshot, replacing the old one atomically '''
+        path = self.path(name)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(
+                dir=self.directory, prefix='.%s.' % name)
+            try:
+                with os.fdopen(fd, 'wb') as stream:
+                    pickle.dump({'key': key, 'data': data}, stream,
+                                protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp, path)
+            except BaseException:
+                os.unlink(tmp)
+                raise
+        except Exception as e:
+            log.warning('could not write cache %s: %s' % (path, e))
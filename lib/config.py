@@ -22,6 +22,34 @@ import yaml
 import glob
 import logging as log
 CONFIG_FILE = 'dmxfs.yml'
+PROFILE_DIR = 'config/fixture_profiles'
+
+# channels in a DMX universe
+UNIVERSE_SIZE = 512
+
+# default output frames per second, DMX512 tops out around 44
+OUTPUT_RATE = 44
+
+# resend an unchanged output frame at least this often (seconds)
+OUTPUT_KEEPALIVE = 1.0
+
+# how input is received: through olad, or straight from Art-Net/sACN
+INPUT_BACKEND = 'ola'
+
+# how output is sent: through olad, or straight out as Art-Net/sACN
+OUTPUT_BACKEND = 'ola'
+
+
+def channel_offsets(channels):
+    '''
+    compile a profile's ordered channel list into a map of
+    channel name to offset from the fixture's DMX id.  If a name is
+    listed twice the first one wins, as channels.index() did.
+    '''
+    offsets = dict()
+    for i, c in enumerate(channels):
+        offsets.setdefault(c, i)
+    return offsets
 
 
 class DMXInput:
@@ -29,31 +57,80 @@ class DMXInput:
         self.data = data
         self.universe = self.data['universe']
         self.id = self.data['id']
+        # ola, or artnet/sacn received straight from the network
+        self.backend = self.data.get('backend', INPUT_BACKEND)
+        self.host = self.data.get('host')
+        self.port = self.data.get('port')
 
 
 class DMXOutput:
     def __init__(self, data):
         self.data = data
         self.universe = self.data['universe']
+        self.rate = self.data.get('rate', OUTPUT_RATE)
+        self.keepalive = self.data.get('keepalive', OUTPUT_KEEPALIVE)
+        # ola, artnet or sacn, the network backends can send to a
+        # host instead of broadcast/multicast
+        self.backend = self.data.get('backend', OUTPUT_BACKEND)
+        self.host = self.data.get('host')
+        self.port = self.data.get('port')
+
+
+class DMXRoute:
+    ''' passthrough from an input universe to an output universe '''
+
+    def __init__(self, data):
+        self.data = data
+        self.input = self.data['input']
+        self.output = self.data['output']
 
 
 class DFSConfig:
-    def __init__(self, path='config/%s' % CONFIG_FILE):
-        log.info('reading config from %s' % path)
+    def __init__(self, path='config/%s' % CONFIG_FILE, cache=None,
+                 profile_path=PROFILE_DIR):
         if not os.path.exists(path):
             print('missing %s, cannot run.' % path)
             sys.exit(1)
-        with open(path, 'r') as stream:
-            self.config = yaml.load(stream, Loader=yaml.FullLoader)
 
-        self.fixture_profiles = self.load_fixture_profiles()
+        # the compiled config is cached keyed by its source files,
+        # shows built from it fold this key into their own
+        self.key = None
+        snapshot = None
+        if cache is not None:
+            self.key = cache.key(
+                [path] + sorted(glob.glob('%s/*.yml' % profile_path)))
+            snapshot = cache.load('config', self.key)
+        if snapshot is None:
+            log.info('reading config from %s' % path)
+            with open(path, 'r') as stream:
+                config = yaml.load(stream, Loader=yaml.FullLoader)
+            snapshot = (config, self.load_fixture_profiles(profile_path))
+            if cache is not None:
+                cache.store('config', self.key, snapshot)
+        self.config, self.fixture_profiles = snapshot
 
         self.dmx = self.config['dmx']
         self.input = DMXInput(self.config['dmx']['input'])
         self.output = DMXOutput(self.config['dmx']['output'])
+
+        # the control input always passes through to the default
+        # output, other universes are routed with dmx: routes:
+        self.routes = [DMXRoute({
+            'input': self.input.universe,
+            'output': self.output.universe})]
+        for route in self.dmx.get('routes') or list():
+            try:
+                self.routes.append(DMXRoute(route))
+            except (KeyError, TypeError):
+                log.error('dmx route %s needs an input and an output '
+                          'universe.' % route)
+                sys.exit(1)
         self.joystick = self.config['joystick']
+        self.reload = self.config.get('reload') or dict()
+        self.metrics = self.config.get('metrics') or dict()
+        self.trace = self.config.get('trace') or dict()
 
-    def load_fixture_profiles(self, path='config/fixture_profiles'):
+    def load_fixture_profiles(self, path=PROFILE_DIR):
         ''' 
         read in each .yml file in the directory as a set of 
         fixtures.
@@ -75,5 +152,6 @@ class DFSConfig:
                             str(e)))
             for k, v in fixtures.items():
                 log.info('  loading fixture %s' % k)
+                v['offsets'] = channel_offsets(v['channels'])
                 all_fixtures[k] = v
         return all_fixtures
@@ -19,9 +19,14 @@
 import logging as log
 import time
 
-from ola.ClientWrapper import ClientWrapper
-from .show import Scene
+from .buttons import ButtonEvents, DEBOUNCE
+from .metrics import Histogram
+from .output import open_output
+from .router import Router
+from .show import SceneIndex
 from .stage import Stage
+from .status import LED_ALTERNATE, LED_BLINK, LED_ROTATE
+from .trace import tracer, MODE, JOY_MODE, RELOAD
 
 # Operation Channel dmx
 OP_PROD = 0x00  # cmd from console only, pointing only 
@@ -36,15 +41,75 @@ MODE_STAGE_EDIT = 0x03
 
 # Scene Channel dmx+2
 
+# the parts of a tick that are timed, in the order they run
+STAGES = ('reload', 'dmx', 'joystick', 'mode', 'merge', 'render', 'send')
+(STAGE_RELOAD, STAGE_DMX, STAGE_JOYSTICK, STAGE_MODE, STAGE_MERGE,
+ STAGE_RENDER, STAGE_SEND) = range(len(STAGES))
+
+
 class DmxHandler:
-    def __init__(self, config, show, stage, joy):
+    def __init__(self, config, show, stage, joy, client=None,
+                 clock=time.monotonic, scenes=None):
         self.config = config
+        self.clock = clock
         self.input = config.input
         self.output = config.output
         self.show = show
         self.stage = stage
+        self.scenes = scenes or SceneIndex(show)
         self.joy = joy
-        self.last_dmx = None
+        self.buttons = ButtonEvents(
+            joy, config.joystick.get('debounce', DEBOUNCE), clock)
+        self.working = None
+
+        # set by record() to write what we receive to a recording
+        self.recorder = None
+
+        # set to a ShowReloader to pick up edited show files
+        self.reloader = None
+
+        # preallocated universes: the router keeps a snapshot of
+        # each input universe and builds every output universe in
+        # place in one frame (out_view) that fixtures render into.
+        # Nothing is allocated per frame.
+        self.router = Router(
+            config.routes, show.universes, self.output.keepalive)
+        self.dmx_in = self.router.inputs[self.input.universe]
+        self.out_view = self.router.out_view
+        self.have_input = False
+        self.fresh = False
+
+        # input to output latency: when the oldest input change not
+        # yet sent arrived, and the delay to the frame carrying it
+        self.changed_at = None
+        self.latency_count = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+        # input frames received, and those replaced by a newer frame
+        # before a tick could use them
+        self.received = 0
+        self.coalesced = 0
+        self.pending = 0
+        self.sent = 0
+        self.skipped = 0
+
+        # time spent in each stage of a tick, the whole tick and
+        # between frames from each input universe
+        self.stage_times = [Histogram(
+            'dmxfs_tick_stage_seconds', 'time spent in each part of a tick',
+            stage=name) for name in STAGES]
+        self.tick_time = Histogram(
+            'dmxfs_tick_seconds', 'time to build and send a frame')
+        self.input_intervals = dict(
+            (u, Histogram('dmxfs_input_interval_seconds',
+                          'time between frames from an input universe',
+                          universe=u))
+            for u in self.router.inputs)
+        self.last_input = dict()
+        self.latency = Histogram(
+            'dmxfs_input_latency_seconds',
+            'time from an input change to the frame that sent it')
 
         # define base setup
         self.mode = OP_PROD
@@ -58,19 +123,13 @@ class DmxHandler:
 
         log.info('starting DMX handler op: %d, mode: %d' % (
             self.op, self.mode))
-        wrapper = ClientWrapper()
-        self.tx = wrapper.Client()
-
-    def _txDmx(self, status):
-        ''' handle DMX send issues '''
-        if status.Succeeded():
-            log.debug('Success!')
-        else:
-            log.error('Error: %s' % status.message)
-
-        # TODO -- need this?
-        if hasattr(self, 'wrapper') and self.wrapper:
-            self.wrapper.Stop()
+        # output goes through olad or straight onto the network.
+        # olad is sent to on the client the main loop services, so
+        # its acks are read; a client of our own would never be.
+        if self.output.backend == 'ola' and client is None:
+            raise ValueError('ola output needs the main loop\'s OLA client')
+        self.out = open_output(self.output, client)
+        self.out.prepare(self.router.universes)
 
     def read_dmx(self):
         ''' 
@@ -79,24 +138,25 @@ class DmxHandler:
               but dmx id starts with 1
         '''
         dmx_i = self.input.id - 1
-        self.op = self.dmx[dmx_i]
-        self.mode = self.dmx[dmx_i + 1]
-        self.scene = self.dmx[dmx_i + 2]
+        self.op = self.dmx_in[dmx_i]
+        self.mode = self.dmx_in[dmx_i + 1]
+        self.scene = self.dmx_in[dmx_i + 2]
 
     def read_joy_mode_changes(self):
-        # log.debug('joystick input %s' % self.joy.reading)
         # allow controller buttons to enter edit modes
         if self.op == OP_PROD:
             # do nothing if in production mode
             return
 
-        if self.joy.Start() and self.joy_mode == MODE_PASSTHRU:
+        if (self.buttons.pressed('Start') and
+                self.joy_mode == MODE_PASSTHRU):
             self.joy_mode = MODE_SCENE_EDIT
 
-        elif self.joy.Guide() and self.joy_mode == MODE_PASSTHRU:
+        elif (self.buttons.pressed('Guide') and
+                self.joy_mode == MODE_PASSTHRU):
             self.joy_mode = MODE_STAGE_EDIT
 
-        elif self.joy.Back():
+        elif self.buttons.pressed('Back'):
             self.joy_mode = MODE_PASSTHRU
 
     def op_change(self):
@@ -113,70 +173,213 @@ class DmxHandler:
         handle mode changes, we do this by loading a class
         on self.working that will have methods for operation
         '''
-        log.debug('mode changed to %d' % self.mode)
+        tracer.record(MODE, self.mode, self.scene, self.op)
         if self.mode == MODE_STAGE_EDIT:
-            log.debug('mode: stage edit %s ' % self.stage.name)
-            self.working = Stage(self.stage, self.show, self.stored)
-            #self.joy.led(10)
-
-        elif (self.mode == MODE_SCENE_EDIT or
-              (self.mode == MODE_SCENE_EDIT and
-                self.scene != self.last_scene)):
-            log.debug('mode: scene edit %s' % self.scene)
-            self.working = Scene(self.show, self.scene)
-            #self.joy.led(13)
-
-        elif (self.mode == MODE_SCENE_RUN or
-              (self.mode == MODE_SCENE_RUN and
-                self.scene != self.last_scene)):
-            log.debug('mode: scene run %s ' % self.scene)
-            self.working = Scene(self.show, self.scene)
-            #self.joy.led(1)
+            log.debug('mode: stage edit %s ', self.stage.name)
+            self.working = self.stage
+            self.joy.led(LED_ROTATE)
+
+        elif self.mode == MODE_SCENE_EDIT:
+            log.debug('mode: scene edit %s', self.scene)
+            self.working = self.scenes.activate(self.scene)
+            self.joy.led(LED_ALTERNATE)
+
+        elif self.mode == MODE_SCENE_RUN:
+            log.debug('mode: scene run %s ', self.scene)
+            self.working = self.scenes.activate(self.scene)
+            self.joy.led(LED_BLINK)
 
         else:
             log.debug('mode: passthrough')
             self.joy.led(self.config.joystick['id'] + 1)
-            del self.working
+            self.working = None
+
+    def register(self, metrics):
+        ''' report our histograms and stats through metrics '''
+        for h in self.stage_times:
+            metrics.add(h)
+        metrics.add(self.tick_time)
+        for h in self.input_intervals.values():
+            metrics.add(h)
+        metrics.add(self.latency)
+        metrics.stats('dmxfs_handler', self.stats)
+        metrics.stats('dmxfs_output', self.out.stats)
+
+    def lap(self, stage, start):
+        ''' time a stage that began at start, returns now '''
+        now = time.perf_counter()
+        self.stage_times[stage].observe(now - start)
+        return now
+
+    def record(self, recorder):
+        ''' write input, joystick state and ticks to recorder '''
+        self.recorder = recorder
+        recorder.joystick(self.joy.state)
 
-    def handle(self, dmx):
+    def swap(self, ready):
+        '''
+        replace the show with a reload, and carry on with what we
+        run from the new one
+        '''
+        start = time.monotonic()
+        old = self.scenes
+        working = self.working
+        self.show = ready.show
+        self.stage = ready.stage
+        self.scenes = ready.scenes
+        if self.show.universes != self.router.universes:
+            self.router.layout(self.show.universes)
+            self.out_view = self.router.out_view
+            self.out.prepare(self.router.universes)
+        # the working scene or stage comes from the new show and the
+        # frame is rebuilt from the input.  Not through mode_change(),
+        # the mode is the same and its LED is set.  A running scene
+        # keeps its live target, group and speed.
+        if self.mode == MODE_STAGE_EDIT:
+            self.working = self.stage
+        elif (self.mode in (MODE_SCENE_RUN, MODE_SCENE_EDIT) and
+                working is not None):
+            self.working = self.scenes.scenes[self.scene]
+            if self.working is not working:
+                self.working.resume(working)
+        self.fresh = True
+        if self.scenes is not old:
+            old.close()
+        took = time.monotonic() - start
+        tracer.record(RELOAD, 0, took * 1000)
+        log.info('reload swapped in %.2fms (built in %.1fms)' % (
+            took * 1000, ready.took * 1000))
+
+    def handle(self, dmx, universe=None):
         ''' 
-        handler callback for DMX input
+        handler callback for DMX input, only the newest frame of
+        each universe is kept; the work is done once per output
+        frame in tick().  universe defaults to the control input.
         '''
-        self.dmx = dmx
-        if self.last_dmx is None or self.last_dmx != self.dmx:
-            # log.debug('dmx input %s' % pprint.pformat(self.dmx))
-            self.last_dmx = self.dmx
+        if universe is None:
+            universe = self.input.universe
+        if self.recorder is not None:
+            self.recorder.input(universe, dmx)
+        now = self.clock()
+        last = self.last_input.get(universe)
+        if last is not None and universe in self.input_intervals:
+            self.input_intervals[universe].observe(now - last)
+        self.last_input[universe] = now
+        if self.router.handle(universe, dmx) and self.changed_at is None:
+            self.changed_at = now
+        if universe == self.input.universe:
+            self.have_input = True
+        self.received += 1
+        self.pending += 1
+
+    def tick(self):
+        '''
+        build and send one output frame from the latest input
+        '''
+        # one clock reading for the recording and the joystick, so
+        # movement replays exactly
+        now = self.clock()
+        if self.recorder is not None:
+            self.recorder.tick(now)
+        if not self.have_input:
+            # nothing from the console yet
+            return
+        if self.pending > 1:
+            self.coalesced += self.pending - 1
+        self.pending = 0
+        start = mark = time.perf_counter()
+
+        # swap in a reloaded show between frames
+        if self.reloader is not None:
+            ready = self.reloader.take()
+            if ready is not None:
+                self.swap(ready)
+        mark = self.lap(STAGE_RELOAD, mark)
 
         # read DMX mode changes
         self.read_dmx()
+        mark = self.lap(STAGE_DMX, mark)
 
-        # read joystick mode changes
+        # read joystick edges, buttons only report a press or
+        # release on the frame it happens so we never need to wait
+        # for a button to settle.
         if self.joy.refresh():
-            log.debug('joystick change %s' % self.joy.reading)
+            if self.recorder is not None:
+                self.recorder.joystick(self.joy.state)
+        if self.buttons.update(now):
+            joy_mode = self.joy_mode
             self.read_joy_mode_changes()
+            if self.joy_mode != joy_mode:
+                tracer.record(JOY_MODE, self.joy_mode)
+        mark = self.lap(STAGE_JOYSTICK, mark)
 
         # joystick overrides console in Tech mode
         if (self.op == OP_TECH and self.joy_mode != MODE_PASSTHRU):
-            log.debug('joystick setting mode to %s' % self.joy_mode)
             self.mode = self.joy_mode
 
-        # handle logic changes,
-        # the sleep is to prevent button bounce.
+        # handle logic changes
         if self.op != self.last_op:
             self.op_change()
-            time.sleep(.2)
             self.last_op = self.op
-        if self.mode != self.last_mode:
+        # a new scene cued in a scene mode counts as a mode change
+        if (self.mode != self.last_mode or
+                (self.scene != self.last_scene and
+                 self.mode in (MODE_SCENE_RUN, MODE_SCENE_EDIT))):
             self.mode_change()
-            time.sleep(.2)
             self.last_mode = self.mode
             self.last_scene = self.scene
+            self.fresh = True
+        mark = self.lap(STAGE_MODE, mark)
+
+        # universes are only rebuilt from the console when their
+        # input or the mode changed, otherwise fixtures write what
+        # moved into the frame we built last tick.
+        if self.router.merge(full=self.fresh):
+            if self.working is not None:
+                self.working.invalidate()
+        self.fresh = False
+        mark = self.lap(STAGE_MERGE, mark)
+
+        # handle operation based on mode, fixtures write straight
+        # into the output buffer.
+        if self.working is None:
+            pass
+
+        elif self.mode == MODE_SCENE_RUN:
+            self.working.run(self.buttons, self.out_view)
 
-        # handle operation based on mode.
-        if self.mode & MODE_SCENE_RUN:
-            self.dmx = self.working.run(self.joy, self.dmx)
+        elif self.mode in (MODE_SCENE_EDIT, MODE_STAGE_EDIT):
+            self.working.edit(self.buttons, self.out_view)
+        mark = self.lap(STAGE_RENDER, mark)
 
-        elif (self.mode & MODE_SCENE_EDIT):
-            self.dmx = self.working.edit(self.joy, self.dmx)
+        self.send()
+        self.tick_time.observe(self.lap(STAGE_SEND, mark) - start)
+
+    def send(self):
+        '''
+        send the universes that changed since they were last sent,
+        unchanged ones are still resent every keepalive seconds.
+        '''
+        now = self.clock()
+        sent, skipped = self.router.send(self.out, now)
+        self.sent += sent
+        self.skipped += skipped
+        if self.changed_at is not None:
+            latency = now - self.changed_at
+            self.changed_at = None
+            self.latency.observe(latency)
+            self.latency_count += 1
+            self.latency_total += latency
+            if latency > self.latency_max:
+                self.latency_max = latency
 
-        self.tx.SendDmx(self.output.universe, self.dmx, self._txDmx)
+    def stats(self):
+        return {
+            'received': self.received,
+            'coalesced': self.coalesced,
+            'sent': self.sent,
+            'skipped': self.skipped,
+            'latency_avg_ms': (self.latency_total * 1000 /
+                               max(self.latency_count, 1)),
+            'latency_max_ms': self.latency_max * 1000,
+        }
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Library General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright (C) 2018 Branson Matheson
+
+from collections import namedtuple
+
+# stick values closer to centre than this read as 0.0
+DEADZONE = 4000
+
+# every button, in bit order.  The triggers count as buttons that
+# are pressed as soon as they leave zero.
+BUTTONS = (
+    'dpadUp', 'dpadDown', 'dpadLeft', 'dpadRight',
+    'Back', 'Guide', 'Start',
+    'leftThumbstick', 'rightThumbstick',
+    'A', 'B', 'X', 'Y',
+    'leftBumper', 'rightBumper',
+    'leftTrigger', 'rightTrigger',
+)
+BIT = dict((name, 1 << i) for i, name in enumerate(BUTTONS))
+LEFT_TRIGGER = BIT['leftTrigger']
+RIGHT_TRIGGER = BIT['rightTrigger']
+
+# where xboxdrv puts each value in its 140 character line
+LINE_AXES = ((3, 9), (13, 19), (24, 30), (34, 40))
+LINE_TRIGGERS = ((129, 132), (136, 139))
+LINE_BUTTONS = (45, 50, 55, 60, 68, 76, 84, 90, 95,
+                100, 104, 108, 112, 118, 123)
+LINE = ('X1:%6d Y1:%6d  X2:%6d Y2:%6d  '
+        'du:%d dd:%d dl:%d dr:%d  back:%d guide:%d start:%d  '
+        'TL:%d TR:%d  A:%d B:%d X:%d Y:%d  LB:%d RB:%d  '
+        'LT:%3d RT:%3d\n')
+
+
+def axis_scale(raw, deadzone):
+    ''' a raw axis (-32768 to 32767) as -1.0 to 1.0 outside deadzone '''
+    if abs(raw) < deadzone:
+        return 0.0
+    if raw < 0:
+        return (raw + deadzone) / (32768.0 - deadzone)
+    return (raw - deadzone) / (32767.0 - deadzone)
+
+
+def edges(old, new):
+    ''' (bit index, 1 pressed / -1 released) for each bit that differs '''
+    changed = old ^ new
+    while changed:
+        low = changed & -changed
+        changed ^= low
+        yield low.bit_length() - 1, 1 if new & low else -1
+
+
+class JoyState(namedtuple('JoyState',
+                          'raw triggers buttons axes deadzone')):
+    '''
+    the controller at one moment, decoded once.
+
+    raw holds the left x/y and right x/y sticks as the controller
+    sends them and axes the same scaled to -1.0..1.0 outside deadzone,
+    triggers are 0-255 and buttons is a bitmask in BUTTONS order.
+    States are immutable, so one can be handed between threads or
+    kept as the previous state to diff against.
+    '''
+    __slots__ = ()
+
+    @classmethod
+    def make(cls, raw, triggers, buttons, deadzone=DEADZONE):
+        ''' a state from raw values, trigger bits are set from triggers '''
+        raw = tuple(raw)
+        triggers = tuple(triggers)
+        buttons &= ~(LEFT_TRIGGER | RIGHT_TRIGGER)
+        if triggers[0]:
+            buttons |= LEFT_TRIGGER
+        if triggers[1]:
+            buttons |= RIGHT_TRIGGER
+        axes = tuple(axis_scale(r, deadzone) for r in raw)
+        return cls(raw, triggers, buttons, axes, deadzone)
+
+    @classmethod
+    def parse(cls, line, deadzone=DEADZONE):
+        ''' a state from an xboxdrv line '''
+        if isinstance(line, bytes):
+            line = line.decode('ascii', 'replace')
+        raw = [int(line[a:b]) for a, b in LINE_AXES]
+        triggers = [int(line[a:b]) for a, b in LINE_TRIGGERS]
+        buttons = 0
+        for i, pos in enumerate(LINE_BUTTONS):
+            if line[pos] == '1':
+                buttons |= 1 << i
+        return cls.make(raw, triggers, buttons, deadzone)
+
+    def line(self):
+        ''' the xboxdrv line for this state '''
+        bits = tuple((self.buttons >> i) & 1
+                     for i in range(len(LINE_BUTTONS)))
+        return LINE % (self.raw + bits + self.triggers)
+
+    def diff(self, prev):
+        ''' masks of the buttons pressed and released since prev '''
+        return (self.buttons & ~prev.buttons, prev.buttons & ~self.buttons)
+
+    def events(self, prev):
+        ''' (button, 1 pressed / -1 released) for each change since prev '''
+        for i, edge in edges(prev.buttons, self.buttons):
+            yield BUTTONS[i], edge
+
+
+# the state of a controller nobody is touching
+IDLE = JoyState.make((0, 0, 0, 0), (0, 0), 0)
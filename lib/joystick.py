@@ -0,0 +1,209 @@
+#!/usr/bin/env python
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Library General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright (C) 2018 Branson Matheson
+
+import glob
+import logging as log
+import os
+import struct
+import sys
+import threading
+import time
+
+from . import xbox
+from .joystate import BIT, DEADZONE, JoyState
+from .metrics import Histogram
+from .status import open_led
+
+# struct input_event: struct timeval, type, code, value
+EVENT = struct.Struct('llHHi')
+
+EV_SYN = 0x00
+EV_KEY = 0x01
+EV_ABS = 0x03
+SYN_REPORT = 0
+
+# how the xpad driver reports an Xbox 360 controller.  Its Y axes
+# point down where xboxdrv's point up, so those are flipped.
+AXES = {
+    0x00: (0, False),   # ABS_X, left x
+    0x01: (1, True),    # ABS_Y, left y
+    0x03: (2, False),   # ABS_RX, right x
+    0x04: (3, True),    # ABS_RY, right y
+}
+TRIGGERS = {
+    0x02: 0,            # ABS_Z, left trigger
+    0x05: 1,            # ABS_RZ, right trigger
+}
+ABS_HAT0X = 0x10
+ABS_HAT0Y = 0x11
+KEYS = {
+    0x130: BIT['A'],
+    0x131: BIT['B'],
+    0x133: BIT['X'],
+    0x134: BIT['Y'],
+    0x136: BIT['leftBumper'],
+    0x137: BIT['rightBumper'],
+    0x13a: BIT['Back'],
+    0x13b: BIT['Start'],
+    0x13c: BIT['Guide'],
+    0x13d: BIT['leftThumbstick'],
+    0x13e: BIT['rightThumbstick'],
+    # the d-pad as buttons (xpad dpad_to_buttons)
+    0x220: BIT['dpadUp'],
+    0x221: BIT['dpadDown'],
+    0x222: BIT['dpadLeft'],
+    0x223: BIT['dpadRight'],
+}
+HAT_X = BIT['dpadLeft'] | BIT['dpadRight']
+HAT_Y = BIT['dpadUp'] | BIT['dpadDown']
+
+# where to look for a controller when no device is configured
+DEVICE_GLOB = '/dev/input/by-id/*-event-joystick'
+
+
+class EvdevJoystick(xbox.Joystick):
+    '''
+    a controller read straight from its kernel event device.
+
+    No xboxdrv process: a reader thread reads struct input_event
+    records from device (any file or pipe of them will do), keeps the
+    sticks, triggers and buttons up to date and publishes a JoyState
+    at every SYN_REPORT, handed over to refresh() the same way as the
+    xboxdrv reader's.  The stick, button and led methods are
+    xbox.Joystick's.
+    '''
+
+    def __init__(self, config={}, device=None):
+        self.deadzone = config.get('deadzone', DEADZONE)
+        self.device = device or config.get('device') or self.find()
+        self.closing = False
+        self.error = None
+
+        # reports read, states that were replaced by a newer one
+        # before refresh() took them, and how old a state is when taken
+        self.lines = 0
+        self.states = 0
+        self.superseded = 0
+        self.latency = Histogram(
+            'dmxfs_joystick_latency_seconds',
+            'time from the controller reporting a state to a frame using it')
+        self.status = open_led(config)
+
+        self.connectStatus = False
+        self.reading = None
+        self.state = JoyState.make((0, 0, 0, 0), (0, 0), 0, self.deadzone)
+        self.published = (0, self.state, None, None)
+        self.consumed = 0
+        self.connect()
+
+    def find(self):
+        ''' the first joystick event device '''
+        devices = sorted(glob.glob(DEVICE_GLOB))
+        if not devices:
+            log.error('no joystick found in %s, set joystick: device:' %
+                      DEVICE_GLOB)
+            sys.exit(1)
+        return devices[0]
+
+    def connect(self, options=[]):
+        log.info('reading joystick events from %s' % self.device)
+        try:
+            self.fd = os.open(self.device, os.O_RDONLY)
+        except OSError as e:
+            log.error('cannot open joystick %s: %s' % (self.device, e))
+            sys.exit(1)
+        self.reader = threading.Thread(
+            target=self.read, args=(self.fd,), name='joystick', daemon=True)
+        self.reader.start()
+
+    def read(self, fd):
+        ''' reader thread: apply events, publish a state at each report '''
+        raw = [0, 0, 0, 0]
+        triggers = [0, 0]
+        buttons = 0
+        seq = 0
+        pending = b''
+        while True:
+            try:
+                data = os.read(fd, EVENT.size * 64)
+            except OSError:
+                data = b''
+            if not data:
+                if not self.closing:
+                    self.error = IOError(
+                        'joystick %s disconnected' % self.device)
+                return
+            if pending:
+                data = pending + data
+            end = len(data) - len(data) % EVENT.size
+            pending = data[end:]
+            for _, _, kind, code, value in EVENT.iter_unpack(data[:end]):
+                if kind == EV_ABS:
+                    if code in AXES:
+                        i, flip = AXES[code]
+                        raw[i] = ~value if flip else value
+                    elif code in TRIGGERS:
+                        triggers[TRIGGERS[code]] = min(max(value, 0), 255)
+                    elif code == ABS_HAT0X:
+                        buttons &= ~HAT_X
+                        if value:
+                            buttons |= BIT['dpadLeft' if value < 0
+                                           else 'dpadRight']
+                    elif code == ABS_HAT0Y:
+                        buttons &= ~HAT_Y
+                        if value:
+                            buttons |= BIT['dpadUp' if value < 0
+                                           else 'dpadDown']
+                elif kind == EV_KEY:
+                    bit = KEYS.get(code)
+                    if bit is not None:
+                        if value:
+                            buttons |= bit
+                        else:
+                            buttons &= ~bit
+                elif kind == EV_SYN and code == SYN_REPORT:
+                    seq += 1
+                    self.lines += 1
+                    self.published = (
+                        seq,
+                        JoyState.make(raw, triggers, buttons, self.deadzone),
+                        None, time.monotonic())
+                    self.connectStatus = True
+
+    def close(self):
+        self.closing = True
+        self.status.close()
+        try:
+            os.close(self.fd)
+        except OSError:
+            pass
+
+
+# joystick: backend values
+BACKENDS = ('xboxdrv', 'evdev')
+
+
+def open_joystick(config, debug=False):
+    ''' the controller configured in joystick: '''
+    backend = config.get('backend', 'xboxdrv')
+    if backend == 'xboxdrv':
+        return xbox.Joystick(debug=debug, config=config)
+    elif backend == 'evdev':
+        return EvdevJoystick(config)
+    log.error('unknown joystick backend %s, use one of %s.' % (
+        backend, ', '.join(BACKENDS)))
+    sys.exit(1)
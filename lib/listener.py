@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Library General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright (C) 2018 Branson Matheson
+
+import logging as log
+import socket
+import struct
+import sys
+
+from .config import UNIVERSE_SIZE
+from .output import (ARTNET_HEADER, ARTNET_OP_DMX, ARTNET_PORT,
+                     SACN_PACKET_ID, SACN_PORT)
+
+# largest packet we read, both protocols fit well inside this
+PACKET_SIZE = 1024
+
+# a sequence number this far behind the last one is taken as a
+# restarted source rather than a late packet (E1.31 6.7.2)
+SEQUENCE_WINDOW = 20
+
+
+class UdpInput:
+    '''
+    DMX received straight from the network as UDP packets.
+
+    The socket is non-blocking and read by ready(), which the frame
+    scheduler calls whenever it is readable.  Packets are read into
+    one reused buffer and the channels of each universe we route are
+    handed to callback(data, universe=...) as a view into it, so
+    nothing is allocated per packet.  Packets that arrive out of
+    order are dropped by sequence number.  Subclasses parse packets
+    for a protocol.
+    '''
+
+    def __init__(self, universes, callback, host, port):
+        self.universes = set(universes)
+        self.callback = callback
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((host, port))
+        self.sock.setblocking(False)
+        self.buffer = bytearray(PACKET_SIZE)
+        self.view = memoryview(self.buffer)
+        self.sequence = dict()
+
+        # stats
+        self.packets = 0
+        self.stale = 0
+        self.ignored = 0
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def ready(self):
+        ''' read every packet waiting on the socket '''
+        while True:
+            try:
+                n = self.sock.recv_into(self.buffer)
+            except (BlockingIOError, InterruptedError):
+                return
+            parsed = self.parse(n)
+            if parsed is None:
+                self.ignored += 1
+                continue
+            universe, seq, start, length = parsed
+            if universe not in self.universes:
+                self.ignored += 1
+                continue
+            if self.is_stale(universe, seq):
+                self.stale += 1
+                continue
+            self.packets += 1
+            self.callback(self.view[start:start + length], universe=universe)
+
+    def is_stale(self, universe, seq):
+        ''' True if seq is older than the last one seen for universe '''
+        if seq == 0:
+            # Art-Net sources that don't sequence send 0
+            return False
+        last = self.sequence.get(universe)
+        self.sequence[universe] = seq
+        if last is None:
+            return False
+        diff = (seq - last) % 256
+        if diff == 0 or diff > 256 - SEQUENCE_WINDOW:
+            # keep the newer sequence we already had
+            self.sequence[universe] = last
+            return True
+        return False
+
+    def close(self):
+        self.sock.close()
+
+    def stats(self):
+        return {
+            'packets': self.packets,
+            'stale': self.stale,
+            'ignored': self.ignored,
+        }
+
+
+class ArtNetInput(UdpInput):
+    ''' ArtDmx packets sent to us or broadcast '''
+
+    def __init__(self, universes, callback, host='', port=ARTNET_PORT):
+        super().__init__(universes, callback, host, port)
+
+    def parse(self, n):
+        buf = self.buffer
+        if n < 18 or self.view[0:8] != ARTNET_HEADER:
+            return None
+        if struct.unpack_from('<H', buf, 8)[0] != ARTNET_OP_DMX:
+            return None
+        universe = struct.unpack_from('<H', buf, 14)[0]
+        length = struct.unpack_from('>H', buf, 16)[0]
+        length = min(length, n - 18, UNIVERSE_SIZE)
+        return universe, buf[12], 18, length
+
+
+class SacnInput(UdpInput):
+    ''' E1.31 data packets, joining the multicast group of each universe '''
+
+    def __init__(self, universes, callback, host='', port=SACN_PORT):
+        super().__init__(universes, callback, host, port)
+        for universe in self.universes:
+            group = '239.255.%d.%d' % (universe >> 8, universe & 0xff)
+            mreq = struct.pack('4s4s', socket.inet_aton(group),
+                               socket.inet_aton(host or '0.0.0.0'))
+            try:
+                self.sock.setsockopt(
+                    socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, mreq)
+            except OSError as e:
+                log.warning('cannot join sACN group %s: %s' % (group, e))
+
+    def parse(self, n):
+        buf = self.buffer
+        if n < 126 or self.view[4:16] != SACN_PACKET_ID:
+            return None
+        # root vector data, framing vector data, DMP set property
+        if (struct.unpack_from('>I', buf, 18)[0] != 0x04 or
+                struct.unpack_from('>I', buf, 40)[0] != 0x02 or
+                buf[117] != 0x02):
+            return None
+        if buf[112] & 0x80:
+            # preview data, not for output
+            return None
+        if buf[125] != 0:
+            # only the null start code carries channel levels
+            return None
+        universe = struct.unpack_from('>H', buf, 113)[0]
+        length = struct.unpack_from('>H', buf, 123)[0] - 1
+        length = min(length, n - 126, UNIVERSE_SIZE)
+        return universe, buf[111], 126, length
+
+
+# dmx: input: backend values
+BACKENDS = ('ola', 'artnet', 'sacn')
+
+
+def open_input(dmx_input, universes, callback):
+    ''' the network input configured in dmx: input: '''
+    if dmx_input.backend == 'artnet':
+        return ArtNetInput(universes, callback, dmx_input.host or '',
+                           dmx_input.port or ARTNET_PORT)
+    elif dmx_input.backend == 'sacn':
+        return SacnInput(universes, callback, dmx_input.host or '',
+                         dmx_input.port or SACN_PORT)
+    log.error('unknown input backend %s, use one of %s.' % (
+        dmx_input.backend, ', '.join(BACKENDS)))
+    sys.exit(1)
@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Library General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright (C) 2018 Branson Matheson
+
+import bisect
+import http.server
+import logging as log
+import os
+import socketserver
+import sys
+import threading
+
+# upper bounds (seconds) of the histogram buckets, from well under a
+# frame's work to several frames at 44Hz
+BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+           0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class Histogram:
+    '''
+    counts of observed values by bucket, as a Prometheus histogram.
+
+    observe() is a bisect and two additions so it can sit in the
+    frame loop; the endpoint thread only reads the counts.
+    '''
+
+    def __init__(self, name, help, buckets=BUCKETS, **labels):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self.labels = ','.join('%s="%s"' % (k, v)
+                               for k, v in sorted(labels.items()))
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, lines):
+        counts = list(self.counts)
+        sep = ',' if self.labels else ''
+        total = 0
+        for bound, n in zip(self.buckets, counts):
+            total += n
+            lines.append('%s_bucket{%s%sle="%g"} %d' % (
+                self.name, self.labels, sep, bound, total))
+        total += counts[-1]
+        lines.append('%s_bucket{%s%sle="+Inf"} %d' % (
+            self.name, self.labels, sep, total))
+        labels = '{%s}' % self.labels if self.labels else ''
+        lines.append('%s_sum%s %.9f' % (self.name, labels, self.sum))
+        lines.append('%s_count%s %d' % (self.name, labels, total))
+
+
+class Metrics:
+    '''
+    everything the metrics endpoint reports.
+
+    Histograms are added by the parts that observe them, and stats()
+    dicts (output backend, listener, reloader ...) are registered by
+    prefix and read when the endpoint is scraped, each number becoming
+    a gauge named prefix_key.
+    '''
+
+    def __init__(self):
+        self.histograms = list()
+        self.sources = list()
+
+    def add(self, histogram):
+        self.histograms.append(histogram)
+        return histogram
+
+    def stats(self, prefix, fn):
+        ''' report the numbers in fn() as gauges '''
+        self.sources.append((prefix, fn))
+
+    def render(self):
+        ''' the Prometheus text format of everything registered '''
+        lines = list()
+        seen = set()
+        for h in self.histograms:
+            if h.name not in seen:
+                seen.add(h.name)
+                lines.append('# HELP %s %s' % (h.name, h.help))
+                lines.append('# TYPE %s histogram' % h.name)
+            h.render(lines)
+        for prefix, fn in self.sources:
+            try:
+                values = fn()
+            except Exception as e:
+                log.warning('metrics from %s failed: %s' % (prefix, e))
+                continue
+            for key in sorted(values):
+                value = values[key]
+                if isinstance(value, bool) or not isinstance(
+                        value, (int, float)):
+                    continue
+                name = '%s_%s' % (prefix, key)
+                lines.append('# TYPE %s gauge' % name)
+                lines.append('%s %s' % (name, value))
+        lines.append('')
+        return '\n'.join(lines)
+
+
+class MetricsServer:
+    '''
+    the metrics endpoint, served from its own thread.
+
+    listen is host:port for HTTP (Prometheus scrapes /metrics) or a
+    path for a UNIX socket that writes the metrics to each client
+    that connects and closes.  Rendering only reads counters, so the
+    frame loop never waits for a scrape.
+    '''
+
+    def __init__(self, metrics, listen):
+        self.metrics = metrics
+        self.listen = listen
+        self.path = None
+        if ':' in listen and not listen.startswith('/'):
+            host, port = listen.rsplit(':', 1)
+            self.server = http.server.ThreadingHTTPServer(
+                (host, int(port)), self.http_handler())
+        else:
+            self.path = listen
+            if os.path.exists(listen):
+                os.unlink(listen)
+            self.server = socketserver.ThreadingUnixStreamServer(
+                listen, self.unix_handler())
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(
+            target=self.server.serve_forever, name='metrics', daemon=True)
+
+    def http_handler(self):
+        metrics = self.metrics
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', CONTENT_TYPE)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                log.debug('metrics: ' + format % args)
+
+        return Handler
+
+    def unix_handler(self):
+        metrics = self.metrics
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                self.wfile.write(metrics.render().encode('utf-8'))
+
+        return Handler
+
+    def start(self):
+        log.info('metrics on %s' % self.listen)
+        self.thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        if self.path is not None and os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+def open_metrics(metrics, config):
+    ''' the endpoint configured in metrics:, None if there isn't one '''
+    listen = config.get('listen')
+    if not listen:
+        return None
+    try:
+        return MetricsServer(metrics, str(listen))
+    except (OSError, ValueError) as e:
+        log.error('cannot serve metrics on %s: %s' % (listen, e))
+        sys.exit(1)
@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Library General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright (C) 2018 Branson Matheson
+
+import math
+
+from .config import OUTPUT_RATE
+
+# speeds were tuned as a step per frame at the default output rate,
+# so a speed moves this many steps a second whatever the frame rate
+SPEED_RATE = OUTPUT_RATE
+
+# seconds between speed steps while the d-pad is held
+SPEED_REPEAT = 0.2
+
+# seconds between focus steps while the d-pad is held
+FOCUS_REPEAT = 0.05
+
+# longest time (seconds) one frame may move for, so a stalled or
+# first frame does not jump
+MAX_STEP = 0.1
+
+# default limits, in stage units (scene targets) and pan/tilt units
+# (stage editing) per second: what the top speed moved before
+MAX_VELOCITY = 220.0
+MAX_PAN_VELOCITY = 22000.0
+
+
+def step(rate, x, y, dt, limit):
+    '''
+    (dx, dy) for a stick at x, y (-1.0 to 1.0) held for dt seconds,
+    rate is the velocity at full stick, the combined velocity is
+    never more than limit per second.
+    '''
+    vx = rate * x
+    vy = rate * y
+    v = math.hypot(vx, vy)
+    if v > limit:
+        vx *= limit / v
+        vy *= limit / v
+    return vx * dt, vy * dt
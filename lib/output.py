@@ -0,0 +1,291 @@
+#!/usr/bin/env python
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Library General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright (C) 2018 Branson Matheson
+
+import collections
+import functools
+import logging as log
+import socket
+import struct
+import sys
+import time
+import uuid
+
+from .config import UNIVERSE_SIZE
+
+ARTNET_PORT = 6454
+ARTNET_HEADER = b'Art-Net\x00'
+ARTNET_OP_DMX = 0x5000
+ARTNET_VERSION = 14
+
+# sends per universe olad may have unacknowledged, and how long we
+# wait for an ack before giving up on it (seconds)
+OLA_MAX_IN_FLIGHT = 2
+OLA_ACK_TIMEOUT = 1.0
+
+SACN_PORT = 5568
+SACN_PACKET_ID = b'ASC-E1.17\x00\x00\x00'
+SACN_PRIORITY = 100
+SACN_SOURCE = 'dmxfs'
+
+
+class OlaOutput:
+    '''
+    universes sent through olad.
+
+    Every SendDmx() is acknowledged by olad on the client's socket,
+    which the frame scheduler services between ticks.  Sends still
+    waiting for their ack are counted per universe, and when a
+    universe has max_in_flight of them we don't queue another: send()
+    refuses the frame and the router tries again next tick with
+    whatever is newest, so a lagging olad drops frames instead of
+    building a backlog.  Acks that never come are given up on after
+    ack_timeout seconds.
+    '''
+
+    def __init__(self, client, max_in_flight=OLA_MAX_IN_FLIGHT,
+                 ack_timeout=OLA_ACK_TIMEOUT, clock=time.monotonic):
+        self.client = client
+        self.max_in_flight = max_in_flight
+        self.ack_timeout = ack_timeout
+        self.clock = clock
+        self.in_flight = dict()     # universe -> send times, oldest first
+        self.callbacks = dict()
+
+        # stats
+        self.packets = 0
+        self.acked = 0
+        self.failed = 0
+        self.lost = 0
+        self.deferred = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    def prepare(self, universes):
+        ''' one ack callback per universe, made once '''
+        for universe in universes:
+            if universe not in self.callbacks:
+                self.in_flight[universe] = collections.deque()
+                self.callbacks[universe] = functools.partial(
+                    self.done, universe)
+
+    def send(self, universe, data):
+        ''' queue a frame, False if olad is too far behind to take it '''
+        pending = self.in_flight[universe]
+        now = self.clock()
+        if pending and now - pending[0] > self.ack_timeout:
+            # olad went away or dropped them, don't wait forever
+            self.lost += len(pending)
+            log.warning('no ack from olad for universe %d in %.1fs, '
+                        'dropping %d sends.' % (
+                            universe, now - pending[0], len(pending)))
+            pending.clear()
+        if len(pending) >= self.max_in_flight:
+            self.deferred += 1
+            return False
+        pending.append(now)
+        self.client.SendDmx(universe, data, self.callbacks[universe])
+        self.packets += 1
+        return True
+
+    def done(self, universe, status):
+        ''' olad acknowledged the oldest send for universe '''
+        pending = self.in_flight[universe]
+        if pending:
+            latency = self.clock() - pending.popleft()
+            self.latency_total += latency
+            if latency > self.latency_max:
+                self.latency_max = latency
+        if status.Succeeded():
+            self.acked += 1
+        else:
+            self.failed += 1
+            log.error('send to universe %d failed: %s' % (
+                universe, status.message))
+
+    def stats(self):
+        return {
+            'packets': self.packets,
+            'acked': self.acked,
+            'failed': self.failed,
+            'lost': self.lost,
+            'deferred': self.deferred,
+            'in_flight': sum(len(p) for p in self.in_flight.values()),
+            'latency_avg_ms': (self.latency_total * 1000 /
+                               max(self.acked + self.failed, 1)),
+            'latency_max_ms': self.latency_max * 1000,
+        }
+
+
+class UdpOutput:
+    '''
+    universes sent straight to the network as UDP packets.
+
+    One packet per universe is built when the universes are known,
+    each send only copies the channels and the sequence number into
+    it, so nothing is allocated per frame.  Subclasses lay out the
+    packets for a protocol.
+    '''
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        self.sock.setblocking(False)
+        self.buffers = dict()
+        self.views = dict()
+        self.sequence = dict()
+        self.addresses = dict()
+
+        # stats
+        self.packets = 0
+        self.errors = 0
+
+    def prepare(self, universes):
+        ''' build a packet for each universe we will send '''
+        for universe in universes:
+            if universe in self.buffers:
+                continue
+            packet = self.packet(universe)
+            if packet is None:
+                continue
+            self.buffers[universe] = packet
+            self.views[universe] = memoryview(packet)[
+                self.DATA:self.DATA + UNIVERSE_SIZE]
+            self.sequence[universe] = 0
+            self.addresses[universe] = (self.address(universe), self.port)
+
+    def send(self, universe, data):
+        packet = self.buffers.get(universe)
+        if packet is None:
+            return True
+        self.views[universe][:] = data
+        seq = self.next_sequence(universe)
+        packet[self.SEQUENCE] = seq
+        try:
+            self.sock.sendto(packet, self.addresses[universe])
+            self.packets += 1
+            return True
+        except OSError as e:
+            # a full socket buffer, try again next frame
+            self.errors += 1
+            log.debug('send of universe %d failed: %s', universe, e)
+            return False
+
+    def address(self, universe):
+        return self.host
+
+    def stats(self):
+        return {'packets': self.packets, 'errors': self.errors}
+
+
+class ArtNetOutput(UdpOutput):
+    ''' ArtDmx packets, broadcast unless a host is given '''
+
+    DATA = 18
+    SEQUENCE = 12
+
+    def __init__(self, host='255.255.255.255', port=ARTNET_PORT):
+        super().__init__(host, port)
+
+    def packet(self, universe):
+        if not 0 <= universe < 0x8000:
+            log.error('universe %d is outside Art-Net, not sent.' % universe)
+            return None
+        packet = bytearray(self.DATA + UNIVERSE_SIZE)
+        packet[0:8] = ARTNET_HEADER
+        struct.pack_into('<H', packet, 8, ARTNET_OP_DMX)
+        struct.pack_into('>H', packet, 10, ARTNET_VERSION)
+        # sequence at 12, physical port at 13
+        struct.pack_into('<H', packet, 14, universe)    # SubUni, Net
+        struct.pack_into('>H', packet, 16, UNIVERSE_SIZE)
+        return packet
+
+    def next_sequence(self, universe):
+        # 1-255, 0 would turn sequencing off at the receiver
+        seq = self.sequence[universe] % 255 + 1
+        self.sequence[universe] = seq
+        return seq
+
+
+class SacnOutput(UdpOutput):
+    ''' E1.31 data packets, multicast unless a host is given '''
+
+    DATA = 126
+    SEQUENCE = 111
+
+    def __init__(self, host=None, port=SACN_PORT, source=SACN_SOURCE,
+                 priority=SACN_PRIORITY):
+        super().__init__(host, port)
+        self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 8)
+        self.source = source.encode('utf-8')[:63]
+        self.priority = priority
+        self.cid = uuid.uuid4().bytes
+
+    def packet(self, universe):
+        if not 1 <= universe <= 63999:
+            log.error('universe %d is outside sACN, not sent.' % universe)
+            return None
+        size = self.DATA + UNIVERSE_SIZE
+        packet = bytearray(size)
+        # root layer
+        struct.pack_into('>HH', packet, 0, 0x0010, 0x0000)
+        packet[4:16] = SACN_PACKET_ID
+        struct.pack_into('>HI', packet, 16, 0x7000 | (size - 16), 0x04)
+        packet[22:38] = self.cid
+        # framing layer, sequence at 111 and options at 112
+        struct.pack_into('>HI', packet, 38, 0x7000 | (size - 38), 0x02)
+        packet[44:44 + len(self.source)] = self.source
+        packet[108] = self.priority
+        struct.pack_into('>H', packet, 113, universe)
+        # DMP layer, start code 0 at 125
+        struct.pack_into('>HBBHHH', packet, 115, 0x7000 | (size - 115),
+                         0x02, 0xa1, 0x0000, 0x0001, UNIVERSE_SIZE + 1)
+        return packet
+
+    def next_sequence(self, universe):
+        seq = (self.sequence[universe] + 1) % 256
+        self.sequence[universe] = seq
+        return seq
+
+    def address(self, universe):
+        if self.host:
+            return self.host
+        # the multicast group for the universe
+        return '239.255.%d.%d' % (universe >> 8, universe & 0xff)
+
+
+# dmx: output: backend values
+BACKENDS = ('ola', 'artnet', 'sacn')
+
+
+def open_output(output, client=None):
+    ''' the output backend configured in dmx: output: '''
+    if output.backend == 'ola':
+        return OlaOutput(client,
+                         output.data.get('max_in_flight', OLA_MAX_IN_FLIGHT),
+                         output.data.get('ack_timeout', OLA_ACK_TIMEOUT))
+    elif output.backend == 'artnet':
+        return ArtNetOutput(output.host or '255.255.255.255',
+                            output.port or ARTNET_PORT)
+    elif output.backend == 'sacn':
+        return SacnOutput(output.host, output.port or SACN_PORT,
+                          output.data.get('source', SACN_SOURCE),
+                          output.data.get('priority', SACN_PRIORITY))
+    log.error('unknown output backend %s, use one of %s.' % (
+        output.backend, ', '.join(BACKENDS)))
+    sys.exit(1)
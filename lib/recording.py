@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Library General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright (C) 2018 Branson Matheson
+
+'''
+recordings of a show: input universes, joystick state and output
+frames in a compact binary file.
+
+The file is a header followed by records, all little endian with
+fixed layouts so it can be read straight out of an mmap:
+
+    header  b'DMXFSREC', version (H)
+    record  kind (B), microseconds since the previous record (I)
+      'I'   input universe:  universe, length, runs (HHH), then runs
+      'O'   output universe: same as 'I'
+      'J'   joystick: left x/y, right x/y (hhhh), triggers (BB),
+            buttons (H, one bit each in joystate.BUTTONS order)
+      'T'   the handler ran a tick
+
+A run is offset, length (HH) and that many bytes; only the bytes of
+a universe that changed since its previous record are stored.
+'''
+
+import mmap
+import struct
+import time
+
+import numpy as np
+
+from .config import UNIVERSE_SIZE
+from .joystate import JoyState, DEADZONE
+
+MAGIC = b'DMXFSREC'
+VERSION = 1
+HEADER = struct.Struct('<8sH')
+RECORD = struct.Struct('<BI')
+UNIVERSE = struct.Struct('<HHH')
+RUN = struct.Struct('<HH')
+JOYSTICK = struct.Struct('<hhhhBBH')
+
+INPUT = ord('I')
+OUTPUT = ord('O')
+JOY = ord('J')
+TICK = ord('T')
+
+# changed bytes closer than this are stored as one run
+RUN_GAP = 4
+
+# the buttons stored, the trigger bits come from the triggers
+BUTTON_MASK = 0x7fff
+
+
+class Recorder:
+    '''
+    appends records to a recording file as the show runs.
+
+    Each universe is compared with the last frame recorded for it
+    and only the runs of bytes that changed are written, so a quiet
+    console costs a few bytes a frame.
+    '''
+
+    def __init__(self, path, clock=time.monotonic):
+        self.path = path
+        self.clock = clock
+        self.stream = open(path, 'wb')
+        self.stream.write(HEADER.pack(MAGIC, VERSION))
+        self.last_us = int(round(self.clock() * 1e6))
+        self.last = dict()      # (kind, universe) -> last frame
+        self.records = 0
+
+    def record(self, kind, now=None):
+        if now is None:
+            now = self.clock()
+        # whole microseconds of the clock, so long recordings don't
+        # drift and replayed times differ exactly as they did live
+        now_us = int(round(now * 1e6))
+        dt = max(now_us - self.last_us, 0)
+        self.last_us += dt
+        self.stream.write(RECORD.pack(kind, dt))
+        self.records += 1
+
+    def universe(self, kind, universe, data):
+        n = min(len(data), UNIVERSE_SIZE)
+        frame = np.zeros(UNIVERSE_SIZE, dtype=np.uint8)
+        frame[:n] = np.frombuffer(data, dtype=np.uint8, count=n)
+        last = self.last.get((kind, universe))
+        if last is None:
+            changed = np.flatnonzero(frame[:n])
+        else:
+            changed = np.flatnonzero(frame != last)
+        self.last[(kind, universe)] = frame
+
+        # group the changed bytes into runs
+        runs = list()
+        if len(changed):
+            breaks = np.flatnonzero(np.diff(changed) > RUN_GAP)
+            starts = np.concatenate(([changed[0]], changed[breaks + 1]))
+            ends = np.concatenate((changed[breaks], [changed[-1]])) + 1
+            runs = list(zip(starts.tolist(), ends.tolist()))
+
+        self.record(kind)
+        self.stream.write(UNIVERSE.pack(universe, n, len(runs)))
+        for start, end in runs:
+            self.stream.write(RUN.pack(start, end - start))
+            self.stream.write(frame[start:end].tobytes())
+
+    def input(self, universe, data):
+        ''' a frame from an input universe '''
+        self.universe(INPUT, universe, data)
+
+    def output(self, universe, data):
+        ''' a frame sent to an output universe '''
+        self.universe(OUTPUT, universe, data)
+
+    def joystick(self, state):
+        ''' the joystick's JoyState '''
+        self.record(JOY)
+        self.stream.write(JOYSTICK.pack(
+            *(state.raw + state.triggers + (state.buttons & BUTTON_MASK,))))
+
+    def tick(self, now=None):
+        ''' a tick, at now if the handler already read the clock '''
+        self.record(TICK, now)
+
+    def close(self):
+        self.stream.close()
+
+
+class Recording:
+    '''
+    a recording read back through an mmap.
+
+    Iterating yields (time, kind, universe, data) with time in
+    seconds from the start; data is the whole frame of the universe
+    for 'I'/'O' (a view of a buffer reused for the next record of
+    that universe), a JoyState with sticks scaled for deadzone for 'J'
+    and None for 'T'.
+    '''
+
+    def __init__(self, path, deadzone=DEADZONE):
+        self.path = path
+        self.deadzone = deadzone
+        with open(path, 'rb') as stream:
+            self.map = mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC:
+            raise ValueError('%s is not a dmxfs recording' % path)
+        if version != VERSION:
+            raise ValueError('%s is version %d, we read %d' % (
+                path, version, VERSION))
+
+    def __iter__(self):
+        buf = self.map
+        pos = HEADER.size
+        end = len(buf)
+        now = 0
+        frames = dict()
+        while pos < end:
+            kind, dt = RECORD.unpack_from(buf, pos)
+            pos += RECORD.size
+            now += dt
+            t = now / 1e6
+            if kind in (INPUT, OUTPUT):
+                universe, n, runs = UNIVERSE.unpack_from(buf, pos)
+                pos += UNIVERSE.size
+                frame = frames.get((kind, universe))
+                if frame is None:
+                    frame = frames[(kind, universe)] = bytearray(
+                        UNIVERSE_SIZE)
+                for _ in range(runs):
+                    start, length = RUN.unpack_from(buf, pos)
+                    pos += RUN.size
+                    frame[start:start + length] = buf[pos:pos + length]
+                    pos += length
+                yield t, kind, universe, memoryview(frame)[:n]
+            elif kind == JOY:
+                values = JOYSTICK.unpack_from(buf, pos)
+                pos += JOYSTICK.size
+                yield t, kind, None, JoyState.make(
+                    values[0:4], values[4:6], values[6], self.deadzone)
+            elif kind == TICK:
+                yield t, kind, None, None
+            else:
+                raise ValueError('bad record %r at %d in %s' % (
+                    kind, pos - RECORD.size, self.path))
+
+    def close(self):
+        self.map.close()
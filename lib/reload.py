@@ -0,0 +1,220 @@
+#!/usr/bin/env python
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Library General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright (C) 2018 Branson Matheson
+
+import glob
+import logging as log
+import os
+import threading
+import time
+
+from .config import DFSConfig, CONFIG_FILE, PROFILE_DIR
+from .show import Show, SceneIndex, SHOW_FILE, SCENE_FILE
+from .stage import Stage, STAGE_FILE
+
+# seconds between checks of the watched files
+RELOAD_INTERVAL = 1.0
+
+
+class Reload:
+    ''' a rebuilt show, ready to be swapped into the handler '''
+
+    def __init__(self, parts, config, show, stage, scenes, stores, took):
+        self.parts = parts
+        self.config = config
+        self.show = show
+        self.stage = stage
+        self.scenes = scenes
+        self.stores = stores    # saves into the old scenes when built
+        self.took = took
+
+
+class ShowReloader:
+    '''
+    watches the config, profiles, show, stage and scene files and
+    rebuilds what depends on the ones that changed.
+
+    Files are polled from a background thread, which also does the
+    rebuild, so the frame loop only picks up the finished objects
+    with take() and swaps them in between two frames.  Only what
+    depends on a changed file is rebuilt: a scene file edit reloads
+    the scenes on the running show, a stage edit the stage, and a
+    show or profile edit the show with its stage and scenes (every
+    fixture of a show shares one table).  A file that fails to load
+    is logged and the running show is kept, as is a config whose dmx
+    settings (inputs, outputs and routes) changed, which only apply
+    at startup.
+    '''
+
+    def __init__(self, config, show, stage, scenes, stage_name,
+                 cache=None, interval=RELOAD_INTERVAL,
+                 config_path='config/%s' % CONFIG_FILE,
+                 profile_path=PROFILE_DIR,
+                 show_path='config/%s' % SHOW_FILE,
+                 stage_path='data/%s' % STAGE_FILE,
+                 scene_path=SCENE_FILE):
+        self.config = config
+        self.show = show
+        self.stage = stage
+        self.scenes = scenes
+        self.stage_name = stage_name
+        self.cache = cache
+        self.interval = interval
+        self.config_path = config_path
+        self.profile_path = profile_path
+        self.show_path = show_path
+        self.stage_path = stage_path
+        self.scene_path = scene_path
+
+        self.lock = threading.Lock()
+        self.ready = None
+        self.retry = set()      # parts to rebuild again
+        self.stop_event = threading.Event()
+        self.seen = self.signatures()
+        self.reloads = 0
+        self.failed = 0
+
+        self.thread = threading.Thread(
+            target=self.run, name='reloader', daemon=True)
+        self.thread.start()
+
+    def watched(self):
+        ''' the files behind each part of a show '''
+        return {
+            'config': [self.config_path] + sorted(
+                glob.glob('%s/*.yml' % self.profile_path)),
+            'show': [self.show_path],
+            'stage': [self.stage_path],
+            'scenes': [self.scene_path],
+        }
+
+    def signatures(self):
+        ''' (path, mtime, size) of each watched file, by part '''
+        sigs = dict()
+        for part, paths in self.watched().items():
+            sig = list()
+            for path in paths:
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                sig.append((path, st.st_mtime_ns, st.st_size))
+            sigs[part] = tuple(sig)
+        return sigs
+
+    def changed(self):
+        ''' parts whose files changed since the last check '''
+        sigs = self.signatures()
+        parts = set(p for p in sigs if sigs[p] != self.seen[p])
+        if 'scenes' in parts:
+            # our own saves are already in the running scenes
+            written = self.scenes.writer.written
+            sig = sigs['scenes']
+            if written and sig and sig[0][1:] == written:
+                parts.discard('scenes')
+        self.seen = sigs
+        return parts
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            with self.lock:
+                if self.ready is not None:
+                    # the last one has not been picked up yet
+                    continue
+                parts, self.retry = self.retry, set()
+            parts |= self.changed()
+            if parts:
+                self.rebuild(parts)
+
+    def stop(self):
+        self.stop_event.set()
+
+    def rebuild(self, parts):
+        ''' build new objects for parts and hand them to take() '''
+        log.info('reloading %s' % ', '.join(sorted(parts)))
+        start = time.monotonic()
+        config, show, stage = self.config, self.show, self.stage
+        scenes = self.scenes
+        stores = self.scenes.writer.stores
+        try:
+            if 'config' in parts:
+                config = DFSConfig(
+                    self.config_path, self.cache, self.profile_path)
+                if config.config.get('dmx') != self.config.config.get('dmx'):
+                    # the router is built from these once, a show laid
+                    # out for other routes would only half apply
+                    self.failed += 1
+                    log.error('dmx settings changed, restart to apply '
+                              'them; keeping the running show.')
+                    return
+                if config.config.get('joystick') != \
+                        self.config.config.get('joystick'):
+                    log.warning('joystick settings changed, they are '
+                                'only read at startup.')
+            if parts & {'config', 'show'}:
+                show = Show(config, self.show.name, self.show_path,
+                            self.cache)
+            if parts & {'config', 'show', 'stage'}:
+                stage = Stage(show, self.stage_name, self.stage_path)
+            if parts & {'config', 'show', 'scenes'}:
+                # saves still queued must be on disk before scenes
+                # are re-read
+                self.scenes.writer.flush()
+                stores = self.scenes.writer.stores
+                scenes = SceneIndex(show, self.scene_path)
+        except (Exception, SystemExit) as e:
+            # the loaders exit on bad config, keep the running show
+            self.failed += 1
+            log.error('reload failed, keeping the running show: %s' % e)
+            return
+
+        took = time.monotonic() - start
+        log.info('rebuilt %s in %.1fms' % (
+            ', '.join(sorted(parts)), took * 1000))
+        with self.lock:
+            self.ready = Reload(
+                parts, config, show, stage, scenes, stores, took)
+
+    def take(self):
+        '''
+        the finished rebuild if there is one, called by the frame
+        loop between frames.  A rebuild that raced a scene save is
+        thrown away and done again.
+        '''
+        with self.lock:
+            ready, self.ready = self.ready, None
+            if ready is None:
+                return None
+            if (ready.scenes is not self.scenes and
+                    ready.stores != self.scenes.writer.stores):
+                self.retry |= ready.parts
+                stale, ready = ready, None
+            else:
+                self.config = ready.config
+                self.show = ready.show
+                self.stage = ready.stage
+                self.scenes = ready.scenes
+                self.reloads += 1
+        if ready is None:
+            log.info('scene saved during reload, reloading again.')
+            stale.scenes.close()
+        return ready
+
+    def stats(self):
+        return {
+            'reloads': self.reloads,
+            'failed': self.failed,
+        }
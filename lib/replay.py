@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Library General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright (C) 2018 Branson Matheson
+
+import logging as log
+import time
+
+from . import xbox
+from .joystate import DEADZONE, IDLE
+from .recording import Recording, INPUT, JOY, TICK
+
+
+class ReplayClock:
+    ''' the time of the record being replayed, for the handler '''
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class ReplayJoystick(xbox.Joystick):
+    ''' a joystick whose states come from a recording, no xboxdrv '''
+
+    def __init__(self, deadzone=DEADZONE):
+        self.deadzone = deadzone
+        self.state = IDLE._replace(deadzone=deadzone)
+        self.reading = self.state.line()
+        self.connectStatus = True
+        self.changed = False
+        self.leds = list()
+
+    def set(self, state):
+        self.state = state
+        self.changed = True
+
+    def refresh(self):
+        ''' True once after each new state '''
+        changed = self.changed
+        self.changed = False
+        return changed
+
+    def led(self, code):
+        self.leds.append(code)
+
+    def close(self):
+        pass
+
+
+class ReplayStatus:
+    ''' an ack from olad that always succeeded '''
+
+    message = ''
+
+    def Succeeded(self):
+        return True
+
+
+class ReplayClient:
+    '''
+    stands in for the OLA client: every universe sent is written to
+    recorder (if any) and acknowledged at once.
+    '''
+
+    def __init__(self, recorder=None):
+        self.recorder = recorder
+        self.status = ReplayStatus()
+        self.packets = 0
+
+    def SendDmx(self, universe, data, callback=None):
+        if self.recorder is not None:
+            self.recorder.output(universe, data)
+        self.packets += 1
+        if callback is not None:
+            callback(self.status)
+        return True
+
+
+class ReplayWriter:
+    '''
+    stands in for the scenes' YamlWriter: saves made in a recording
+    are counted and kept in memory, the live scenes file is never
+    written.
+    '''
+
+    def __init__(self):
+        self.stores = 0
+        self.written = None
+
+    def store(self, data):
+        self.stores += 1
+
+    def flush(self, timeout=None):
+        return True
+
+    def close(self, timeout=None):
+        pass
+
+    def stats(self):
+        return {
+            'stores': self.stores,
+            'writes': 0,
+        }
+
+
+class Replay:
+    '''
+    drives a DmxHandler from a recording.
+
+    Input universes are handed to handler.handle(), joystick states
+    to the ReplayJoystick and the handler ticks where the recording
+    ticked, with clock set to the recorded time of each record so
+    debounce, keepalive and latency see what they saw live.  A tick
+    is run once the joystick states taken during it have been
+    applied.  With realtime the records are paced as recorded,
+    otherwise they are replayed as fast as the handler can go.
+    '''
+
+    def __init__(self, path, handler, joy, clock, realtime=True):
+        self.recording = Recording(path, joy.deadzone)
+        self.handler = handler
+        self.joy = joy
+        self.clock = clock
+        self.realtime = realtime
+        self.running = False
+
+        # stats
+        self.records = 0
+        self.ticks = 0
+        self.took = 0.0
+        self.tick_time = 0.0
+        self.tick_max = 0.0
+
+    def stop(self):
+        self.running = False
+
+    def tick(self, when):
+        self.clock.now = when
+        start = time.perf_counter()
+        self.handler.tick()
+        took = time.perf_counter() - start
+        self.ticks += 1
+        self.tick_time += took
+        if took > self.tick_max:
+            self.tick_max = took
+
+    def run(self):
+        ''' replay every record, or until stop() '''
+        log.info('replaying %s' % self.recording.path)
+        self.running = True
+        start = time.perf_counter()
+        pending = None      # time of a tick waiting for its joystick
+        for when, kind, universe, data in self.recording:
+            if not self.running:
+                break
+            self.records += 1
+            if kind == JOY and pending is not None:
+                self.joy.set(data)
+                continue
+            if pending is not None:
+                self.tick(pending)
+                pending = None
+            if self.realtime:
+                delay = start + when - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            self.clock.now = when
+            if kind == INPUT:
+                self.handler.handle(data, universe=universe)
+            elif kind == JOY:
+                self.joy.set(data)
+            elif kind == TICK:
+                pending = when
+        if pending is not None and self.running:
+            self.tick(pending)
+        self.took = time.perf_counter() - start
+        self.running = False
+        self.recording.close()
+
+    def stats(self):
+        return {
+            'records': self.records,
+            'ticks': self.ticks,
+            'took_s': self.took,
+            'fps': self.ticks / self.took if self.took else 0.0,
+            'tick_avg_ms': self.tick_time * 1000 / max(self.ticks, 1),
+            'tick_max_ms': self.tick_max * 1000,
+        }
@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Library General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright (C) 2018 Branson Matheson
+
+import array
+import logging as log
+
+import numpy as np
+
+from .config import UNIVERSE_SIZE
+from .trace import tracer, SEND
+
+
+class Router:
+    '''
+    input and output universes, and the passthrough between them.
+
+    Every input universe named by a route has a buffer that keeps the
+    newest frame the console sent.  The output universes are laid end
+    to end in one frame (in the order the show's fixture table uses)
+    so fixtures can be rendered into it with one copy; merge() fills
+    each output from the inputs routed to it, highest value wins when
+    several inputs share an output, and send() only hands the
+    universes whose bytes changed to the output backend.
+    '''
+
+    def __init__(self, routes, universes, keepalive):
+        self.routes = routes
+        self.keepalive = keepalive
+
+        # input universe -> buffer, length of the last frame, and
+        # whether it changed since the last merge
+        self.inputs = dict()
+        self.in_views = dict()
+        self.in_len = dict()
+        self.np_in = dict()
+        self.fresh = set()
+        for route in routes:
+            if route.input in self.inputs:
+                continue
+            buf = array.array('B', bytes(UNIVERSE_SIZE))
+            self.inputs[route.input] = buf
+            self.in_views[route.input] = memoryview(buf)
+            self.in_len[route.input] = 0
+            self.np_in[route.input] = np.frombuffer(buf, dtype=np.uint8)
+        self.zero = bytes(UNIVERSE_SIZE)
+
+        self.layout(universes)
+
+    def layout(self, universes):
+        ''' allocate the output frame for universes, in this order '''
+        self.universes = list(universes)
+        size = len(self.universes) * UNIVERSE_SIZE
+        self.dmx = array.array('B', bytes(size))
+        self.last_sent = array.array('B', bytes(size))
+        self.out_view = memoryview(self.dmx)
+        self.sent_view = memoryview(self.last_sent)
+        self.np_out = np.frombuffer(self.dmx, dtype=np.uint8)
+
+        # per universe views onto the frame, and send state
+        self.out_views = list()
+        self.sent_views = list()
+        self.np_outs = list()
+        for slot in range(len(self.universes)):
+            span = slice(slot * UNIVERSE_SIZE, (slot + 1) * UNIVERSE_SIZE)
+            self.out_views.append(self.out_view[span])
+            self.sent_views.append(self.sent_view[span])
+            self.np_outs.append(self.np_out[span])
+        self.have_sent = [False] * len(self.universes)
+        self.last_send_time = [0.0] * len(self.universes)
+
+        # the inputs routed to each output slot
+        slots = dict((u, i) for i, u in enumerate(self.universes))
+        self.sources = [list() for _ in self.universes]
+        for route in self.routes:
+            if route.output not in slots:
+                continue
+            if route.input not in self.sources[slots[route.output]]:
+                self.sources[slots[route.output]].append(route.input)
+
+        # everything has to be rebuilt and resent
+        self.fresh = set(self.inputs)
+        log.info('output universes %s' % self.universes)
+
+    def handle(self, universe, dmx):
+        '''
+        store a frame from an input universe, True if it changed
+        anything.  Frames for universes we don't route are ignored.
+        '''
+        if universe not in self.inputs:
+            return False
+        n = min(len(dmx), UNIVERSE_SIZE)
+        src = memoryview(dmx)[:n]
+        view = self.in_views[universe]
+        last = self.in_len[universe]
+        if n == last and src == view[:n]:
+            return False
+        view[:n] = src
+        if n < last:
+            # console sent a shorter frame, the rest is zero
+            view[n:last] = self.zero[n:last]
+        self.in_len[universe] = n
+        self.fresh.add(universe)
+        return True
+
+    def merge(self, full=False):
+        '''
+        rebuild the outputs fed by an input that changed (or all of
+        them), True if any output was rebuilt.
+        '''
+        if not full and not self.fresh:
+            return False
+        for slot, sources in enumerate(self.sources):
+            if not full and self.fresh.isdisjoint(sources):
+                continue
+            out = self.np_outs[slot]
+            if not sources:
+                out[:] = 0
+                continue
+            out[:] = self.np_in[sources[0]]
+            for universe in sources[1:]:
+                np.maximum(out, self.np_in[universe], out=out)
+        self.fresh.clear()
+        return True
+
+    def send(self, output, now):
+        '''
+        send each universe that differs from what we last sent it,
+        an unchanged universe is still resent every keepalive seconds.
+        A universe the backend refuses is left unsent and tried again
+        next tick.  Returns how many universes were sent and skipped.
+        '''
+        sent = skipped = 0
+        for slot, universe in enumerate(self.universes):
+            out = self.out_views[slot]
+            if (self.have_sent[slot] and
+                    out == self.sent_views[slot] and
+                    now - self.last_send_time[slot] < self.keepalive):
+                skipped += 1
+                continue
+            if not output.send(universe, out):
+                tracer.record(SEND, universe, 0)
+                continue
+            tracer.record(SEND, universe, 1)
+            self.sent_views[slot][:] = out
+            self.have_sent[slot] = True
+            self.last_send_time[slot] = now
+            sent += 1
+        return sent, skipped
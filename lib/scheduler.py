@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Library General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright (C) 2018 Branson Matheson
+
+import logging as log
+import select
+import time
+
+from .metrics import Histogram
+from .trace import tracer, OVERRUN
+
+
+class FrameScheduler:
+    '''
+    main loop that calls tick() at a fixed rate.
+
+    Input sockets (the OLA client, anything else) are registered with
+    add_reader() and serviced while we wait for the next tick, so
+    input callbacks only store data and the output rate no longer
+    depends on how often the console sends.  We run our own select
+    loop rather than ClientWrapper.Run() so the deadline is ours and
+    not rounded by the OLA timer queue.
+    '''
+
+    def __init__(self, tick, rate, clock=time.monotonic):
+        self.tick = tick
+        self.rate = rate
+        self.period = 1.0 / rate
+        self.clock = clock
+        self.readers = dict()
+        self.running = False
+        self.next = None
+
+        # stats
+        self.ticks = 0
+        self.overruns = 0   # ticks that took longer than a period
+        self.missed = 0     # tick slots dropped because we fell behind
+        self.max_tick = 0.0
+        self.last_tick = None
+        # output jitter: how late each tick starts, and the time
+        # between the starts of two ticks
+        self.lateness = Histogram(
+            'dmxfs_tick_lateness_seconds',
+            'how long after its deadline a tick started')
+        self.interval = Histogram(
+            'dmxfs_tick_interval_seconds', 'time between output ticks')
+
+    def add_reader(self, fd, callback):
+        ''' call callback whenever fd is readable '''
+        self.readers[fd] = callback
+
+    def remove_reader(self, fd):
+        if fd in self.readers:
+            del self.readers[fd]
+
+    def register(self, metrics):
+        ''' report our histograms and stats through metrics '''
+        metrics.add(self.lateness)
+        metrics.add(self.interval)
+        metrics.stats('dmxfs_scheduler', self.stats)
+
+    def stop(self):
+        self.running = False
+
+    def run(self):
+        ''' loop until stop() is called '''
+        log.info('output running at %d Hz' % self.rate)
+        self.running = True
+        self.next = self.clock()
+        while self.running:
+            self.run_once()
+
+    def run_once(self):
+        ''' wait for input until the next deadline, then tick if due '''
+        timeout = max(0.0, self.next - self.clock())
+        if self.readers:
+            readable, _, _ = select.select(
+                list(self.readers.keys()), [], [], timeout)
+            for fd in readable:
+                self.readers[fd]()
+        elif timeout:
+            time.sleep(timeout)
+
+        now = self.clock()
+        if now >= self.next:
+            self.run_tick(now)
+
+    def run_tick(self, now):
+        ''' run one tick and schedule the next deadline '''
+        self.lateness.observe(now - self.next)
+        if self.last_tick is not None:
+            self.interval.observe(now - self.last_tick)
+        self.last_tick = now
+        self.tick()
+        self.ticks += 1
+        end = self.clock()
+        took = end - now
+        if took > self.max_tick:
+            self.max_tick = took
+        if took > self.period:
+            self.overruns += 1
+            tracer.record(OVERRUN, self.ticks, took * 1000)
+
+        # stay on the original grid, but if we have fallen more than
+        # a period behind drop the missed slots instead of bursting
+        # frames to catch up.
+        self.next += self.period
+        if end - self.next >= self.period:
+            behind = int((end - self.next) / self.period)
+            self.missed += behind
+            self.next += behind * self.period
+
+    def stats(self):
+        return {
+            'rate': self.rate,
+            'ticks': self.ticks,
+            'overruns': self.overruns,
+            'missed': self.missed,
+            'max_tick_ms': self.max_tick * 1000,
+        }
@@ -23,9 +23,15 @@ import math
 import os
 import yaml
 import pprint
-import time
 import sys
 
+from .config import UNIVERSE_SIZE
+from .motion import step, SPEED_RATE, SPEED_REPEAT, MAX_VELOCITY
+from .solver import PanTiltSolver
+from .table import FixtureTable
+from .trace import tracer, TARGET, POINT, MOVE
+from .writer import YamlWriter
+
 
 def clamp(n, minn, maxn):
     ''' require an int to remain between a min and max value '''
@@ -43,21 +49,27 @@ class Show:
     which are used on a Stage to present Scenes at Targets
     '''
 
-    def __init__(self, config, name, path='config/%s' % SHOW_FILE):
+    def __init__(self, config, name, path='config/%s' % SHOW_FILE,
+                 cache=None):
         self.config = config
         self.name = name
-        log.info('reading shows from %s' % path)
+
+        # the compiled show (profiles resolved, aspects flattened) is
+        # cached keyed by the show file and the config it was built
+        # against, so a restart skips parsing and validation.
         if not os.path.exists(path):
             print('missing %s, cannot run.' % path)
             sys.exit(1)
-        with open(path, 'r') as stream:
-            self.data = yaml.load(stream, Loader=yaml.FullLoader)
-            
-        if name not in self.data['shows']:
-            log.error('no such show %s in %s' % ( name, path))
-            sys.exit(1)
-        self.show = self.data['shows'][name]
-        
+        key = None
+        self.show = None
+        if cache is not None and config.key is not None:
+            key = cache.key([path], config.key, name)
+            self.show = cache.load('show-%s' % name, key)
+        if self.show is None:
+            self.show = self.compile(path)
+            if key is not None:
+                cache.store('show-%s' % name, key, self.show)
+
         # general stage definitions
         # TODO: handle if not here
         self.stage = self.show['stage']
@@ -66,38 +78,84 @@ class Show:
         # TODO: other methods?
         self.joystick = self.config.joystick
 
+        self.fixture_aspects = self.show['fixture_aspects']
+        self.fixtures = self.show['fixtures']
+        self.fixture_groups = self.show['fixture_groups']
+
+        # create group names for an ordered list to iterate across.
+        self.fixture_group_names = sorted( self.fixture_groups.keys())
+
+        # every universe we output, in the order they are laid out
+        # in the output frame
+        self.universes = sorted(
+            set(f['universe'] for f in self.fixtures.values()) |
+            set(r.output for r in self.config.routes))
+
+        # one table of fixture state for the whole show, every
+        # Fixture is a view onto a row of it
+        self.table = FixtureTable(self.fixtures, self.universes)
+
+        # registry: each fixture and group is built once here and
+        # shared by every scene and the stage, so switching groups
+        # is a lookup and keeps fixture state.
+        self.fixture_views = dict()
+        for fname in self.fixtures:
+            self.fixture_views[fname] = Fixture(self, fname)
+        self.groups = dict()
+        for gname in self.fixture_group_names:
+            self.groups[gname] = FixtureGroup(self, gname)
+
+        # ring of group names for next/previous
+        count = len(self.fixture_group_names)
+        self.next_group = dict()
+        self.prev_group = dict()
+        for i, gname in enumerate(self.fixture_group_names):
+            self.next_group[gname] = self.fixture_group_names[(i + 1) % count]
+            self.prev_group[gname] = self.fixture_group_names[(i - 1) % count]
+
+    def compile(self, path):
+        '''
+        read our show from path, check it and backfill each fixture
+        with its profile and aspect.
+        '''
+        log.info('reading shows from %s' % path)
+        with open(path, 'r') as stream:
+            data = yaml.load(stream, Loader=yaml.FullLoader)
+
+        if self.name not in data['shows']:
+            log.error('no such show %s in %s' % (self.name, path))
+            sys.exit(1)
+        show = data['shows'][self.name]
+
         # TODO: Flexible aspects by stage .. overridable?
-        if 'fixture_aspects' in self.show:
-            self.fixture_aspects = self.show['fixture_aspects']
+        if 'fixture_aspects' in show:
+            fixture_aspects = show['fixture_aspects']
         else:
             log.warn('No fixture aspects defined, assuming all'
                      ' fixtures are on their feet and connections'
                      ' are facing up-stage.')
-            self.fixture_aspects = dict()
+            fixture_aspects = dict()
 
         # read fixtures
-        if 'fixtures' not in self.show:
+        if 'fixtures' not in show:
             log.warn('No fixtures defined for show: %s, nothing'
                      ' to do, but will passthrough all DMX.')
-            self.fixtures = dict()
+            fixtures = dict()
         else:
-            self.fixtures = self.show['fixtures']
+            fixtures = show['fixtures']
 
         # read fixture groups, and create an 'all' group
-        if 'fixture_groups' not in self.show:
+        if 'fixture_groups' not in show:
             log.warn('No fixture groups defined, however the "all"'
                      ' group will be created by default.')
-            self.fixture_groups = dict()
+            fixture_groups = dict()
         else:
-            self.fixture_groups = self.show['fixture_groups']
-        self.fixture_groups['all'] = list(self.fixtures.keys())
-
-        # create group names for an ordered list to iterate across.
-        self.fixture_group_names = sorted( self.fixture_groups.keys())
+            fixture_groups = show['fixture_groups']
+        fixture_groups['all'] = list(fixtures.keys())
 
         # backfill fixtures with config from profiles and aspects.
-        for fname in self.fixtures:
-            fixture = self.fixtures[fname]
+        for fname in fixtures:
+            fixture = fixtures[fname]
 
             # check for profile
             profile = fixture['profile']
@@ -108,18 +166,34 @@ class Show:
                 sys.exit(1)
             fixture['profile'] = self.config.fixture_profiles[profile]
 
+            # fixtures go to the default output unless they say
+            universe = fixture.setdefault(
+                'universe', self.config.output.universe)
+            if not isinstance(universe, int) or universe < 0:
+                log.error('fixture %s configured in show %s has bad '
+                          'universe %s.' % (fname, self.name, universe))
+                sys.exit(1)
+
+            # the whole footprint has to fit in the universe
+            last = fixture['id'] + len(fixture['profile']['channels']) - 1
+            if fixture['id'] < 1 or last > UNIVERSE_SIZE:
+                log.error('fixture %s configured in show %s uses '
+                          'channels %d-%d, outside the universe.'
+                          % (fname, self.name, fixture['id'], last))
+                sys.exit(1)
+
             fixture['inverted'] = False
             fixture['reversed'] = False
             # check for aspect
             if 'aspect' in fixture:
                 aspect_name = fixture['aspect']
-                if aspect_name not in self.fixture_aspects:
+                if aspect_name not in fixture_aspects:
                     log.error('fixture %s configured in show %s '
                               ' with aspect %s but that is not defined.'
                               % (fname, self.name, aspect_name))
                     sys.exit(1)
 
-                aspect = self.fixture_aspects[aspect_name]
+                aspect = fixture_aspects[aspect_name]
                 fixture['inverted'] = (
                     True if 'hanging' in aspect or
                             'inverted' in aspect
@@ -129,9 +203,25 @@ class Show:
                             'backward' in aspect
                     else False)
 
+        show['fixture_aspects'] = fixture_aspects
+        show['fixtures'] = fixtures
+        show['fixture_groups'] = fixture_groups
+        return show
+
+    def fixture(self, name):
+        ''' the shared Fixture for name '''
+        return self.fixture_views[name]
+
+    def group(self, name):
+        ''' the shared FixtureGroup for name '''
+        return self.groups[name]
+
 
 SCENE_FILE = 'data/scenes.yml'
 
+# stage units a second the height changes while the d-pad is held
+HEIGHT_RATE = 0.5 * SPEED_RATE
+
 
 class Scene:
     ''' 
@@ -140,27 +230,20 @@ class Scene:
     a starting location and height for this Target
     '''
 
-    def __init__(self, show, scene_id, path=SCENE_FILE):
+    def __init__(self, show, scene_id, data, writer=None):
         self.show = show
         self.scene_id = scene_id
-        self.path = path
+        self.writer = writer
         self.deadzone = self.show.config.joystick['deadzone']
-        self.edit_mode = 0
+        self.max_velocity = self.show.config.joystick.get(
+            'max_velocity', MAX_VELOCITY)
         # TODO allow scenes to have followspot mode
         self.followspot_mode = 0
 
-        # read scene if exists
-        if not os.path.exists(path):
-            print('missing %s, will create when stored.' % path)
-            self.data = dict()
-        else:
-            with open(path, 'r') as stream:
-                self.data = yaml.load(stream)
-
-        if scene_id not in self.data:
-            self.data[scene_id] = dict()
-
-        self.scene = self.data[scene_id]
+        # stored scene if it exists, it is only added to the
+        # scene data once saved
+        self.data = data
+        self.scene = dict(self.data.get(scene_id) or {})
 
         # initialize scene if it doesn't exists
         if 'name' not in self.scene:
@@ -178,53 +261,99 @@ class Scene:
             # TODO: non-followspot mode
             self.followspot_mode = 1
 
-        # set up accessors
         self.name = self.scene['name']
+        self.prepare()
+        self.reset()
+
+    def prepare(self):
+        ''' resolve our group and solve pan/tilt for the start '''
+        name = self.scene['fixture_group']
+        if name not in self.show.groups:
+            # a stored scene can outlive its group, don't fail the
+            # whole index for it
+            log.warning('scene %s: no fixture group %s, using %s.' % (
+                self.scene_id, name, self.show.fixture_group_names[0]))
+            name = self.show.fixture_group_names[0]
+        self.start_group = self.show.group(name)
+        self.solution = self.start_group.solver.presolve(Target(
+            self.name,
+            self.scene['x'],
+            self.scene['y'],
+            self.scene['z']))
+
+    def reset(self):
+        ''' back to the stored start, without touching the fixtures '''
+        # set up accessors
         self.speed = self.scene['speed']
         self.x = self.scene['x']
         self.y = self.scene['y']
         self.z = self.scene['z']
 
         # starting/working data
+        self.edit_mode = 0
         self.all_lights = False
-        self.fixture_group = FixtureGroup(
-            self.show,
-            self.scene['fixture_group'])
+        self.fixture_group = self.start_group
         self.target = Target(
             self.name,
             self.scene['x'],
             self.scene['y'],
             self.scene['z'])
 
+    def resume(self, old):
+        '''
+        carry on where old (this scene before a reload) was: the live
+        target, group, speed and lights, aimed on our show
+        '''
+        self.reset()
+        self.speed = old.speed
+        self.z = old.z
+        self.edit_mode = old.edit_mode
+        self.all_lights = old.all_lights
+        self.target = old.target
+        name = old.fixture_group.name
+        if name in self.show.groups:
+            self.fixture_group = self.show.group(name)
+        if self.all_lights:
+            self.fixture_group.lights_on()
         self.fixture_group.point_to(self.target)
 
-    def save(self, path=SCENE_FILE):
-        ''' write the scene file out '''
-        if not os.path.exists(path):
-            log.info('missing %s, cannot read old.' % path)
-        else:
-            with open(path, 'r') as stream:
-                data = yaml.load(stream)
-
-        data[self.scene_id] = self.scene
-
-        log.info('writing %s with %d entries.' % (
-            path, len(self.data)))
-        with open(path, 'w') as stream:
-            yaml.dump(data, stream, default_flow_style=False)
+    def cue(self):
+        ''' reset and aim our group at the stored start '''
+        self.reset()
+        self.fixture_group.solver.apply(self.solution)
+
+    def save(self):
+        ''' store the scene, the file is written in the background '''
+        # the working state becomes the stored start
+        self.scene['speed'] = self.speed
+        self.scene['x'] = self.target.x
+        self.scene['y'] = self.target.y
+        self.scene['z'] = self.z
+        self.scene['fixture_group'] = self.fixture_group.name
+        self.prepare()
+
+        # the index holds every scene read at startup, so the file
+        # is rewritten from it rather than read back first
+        self.data[self.scene_id] = self.scene
+        if self.writer is None:
+            log.warning('no writer, scene %d kept in memory only.' %
+                        self.scene_id)
+            return
+        self.writer.store(self.data)
 
     def run(self, joy, dmx):
-        ''' take input and modify position'''
-        if not self.edit_mode and joy.Start():
-            self.edit_mode = 1
-        elif self.edit_mode and joy.Start():
-            self.edit_mode = 0
+        '''
+        take input and modify position, only pan/tilt is ours while
+        running, the console keeps the lights
+        '''
+        if joy.pressed('Start'):
+            self.edit_mode = 0 if self.edit_mode else 1
 
         if self.edit_mode:
-            dmx = handle_commands(joy.dmx)
+            dmx = self.handle_commands(joy, dmx, lights=False)
 
         dmx = self.handle_movement(joy, dmx)
-        return dmx
+        return self.fixture_group.update_movement(dmx)
 
     def edit(self, joy, dmx):
         ''' edit mode '''
@@ -232,89 +361,130 @@ class Scene:
         dmx = self.handle_lights(joy, dmx)
         dmx = self.handle_movement(joy, dmx)
         return self.fixture_group.update_dmx(dmx)
+
+    def invalidate(self):
+        ''' the frame was replaced, rewrite our fixtures next update '''
+        self.fixture_group.invalidate()
     
-    def handle_commands(self, joy, dmx):
-        ''' handle command type input'''
-        if joy.B():
+    def handle_commands(self, joy, dmx, lights=True):
+        ''' handle command type input, lights if we control them '''
+        if joy.pressed('B'):
             log.info('saving scene %d' % self.scene_id)
             self.save()
-        elif joy.Back():
+        elif joy.pressed('Back'):
             log.info('reverting to sent DMX values.')
 
-        elif joy.rightBumper():
-            self.fixture_group.lights_off()
+        elif joy.pressed('rightBumper'):
             # rotate forwards
-            new_name = ( 
-                ( self.show.fixture_group_names.index(
-                    self.fixture_group.name) + 1) % (
-                    len(self.show.fixture_group_names)))
-
-            self.fixture_group = FixtureGroup(
-                self.show,
-                self.show.fixture_group_names[new_name]
-            )
-            self.fixture_group.point_to(self.target)
-        elif joy.leftBumper():
-            self.fixture_group.lights_off()
+            dmx = self.change_group(
+                self.show.next_group[self.fixture_group.name], dmx, lights)
+        elif joy.pressed('leftBumper'):
             # rotate backwards
-            new_name = ( 
-                ( self.show.fixture_group_names.index(
-                    self.fixture_group.name) - 1) % (
-                    len(self.show.fixture_group_names)))
-            self.fixture_group = FixtureGroup(
-                self.show,
-                self.show.fixture_group_names[new_name]
-            )
-            self.fixture_group.point_to(self.target)
+            dmx = self.change_group(
+                self.show.prev_group[self.fixture_group.name], dmx, lights)
+        return dmx
+
+    def change_group(self, name, dmx, lights=True):
+        ''' switch to another group, turning off the one we leave '''
+        if lights:
+            self.fixture_group.lights_off()
+            dmx = self.fixture_group.update_dmx(dmx)
+        self.fixture_group = self.show.group(name)
+        self.fixture_group.point_to(self.target)
         return dmx
 
     def handle_movement(self, joy, dmx):
         ''' handle movement type input'''
-        # Movement speed, left and right
-        if joy.dpadUp():
+        # Movement speed, left and right, repeats while held
+        if joy.pressed('dpadUp', repeat=SPEED_REPEAT):
             self.speed = clamp(self.speed + 5, 2, 500)
-            log.debug(' speed: %d' % self.speed)
-            time.sleep(0.2)
-        elif joy.dpadDown():
+            log.debug(' speed: %d', self.speed)
+        elif joy.pressed('dpadDown', repeat=SPEED_REPEAT):
             self.speed = clamp(self.speed - 5, 2, 500)
-            log.debug(' speed: %d' % self.speed)
-            time.sleep(0.2)
+            log.debug(' speed: %d', self.speed)
 
         # handle height, up and down
         # TODO: need to predefine max height somewhere
         if joy.dpadUp():
-            self.z = clamp(self.z + .5, 1, 20)
+            self.z = clamp(self.z + HEIGHT_RATE * joy.dt, 1, 20)
         elif joy.dpadDown():
-            self.z = clamp(self.z - .5, 1, 20)
+            self.z = clamp(self.z - HEIGHT_RATE * joy.dt, 1, 20)
 
-        # handle movement
+        # handle movement, speed is in hundredths of a stage unit a
+        # step, integrated over the time since the last frame
         rx = joy.rightX(self.deadzone)
         ry = joy.rightY(self.deadzone)
         if rx or ry:
-            self.target.x += self.speed * rx / 100
-            self.target.y += self.speed * ry / 100
-            log.debug('target: %f, %f' % (self.target.x, self.target.y))
+            dx, dy = step(self.speed * SPEED_RATE / 100, rx, ry, joy.dt,
+                          self.max_velocity)
+            self.target.x += dx
+            self.target.y += dy
+            tracer.record(TARGET, self.scene_id, self.target.x, self.target.y)
             self.fixture_group.point_to(self.target)
         return dmx
 
     def handle_lights(self, joy, dmx):
         ''' handle light control'''
         # handle light
-        if self.all_lights == False and joy.rightTrigger():
+        if self.all_lights == False and joy.pressed('rightTrigger'):
             self.all_lights = True
             self.fixture_group.lights_on()
             log.debug('all_on')
-            time.sleep(0.2)
             return self.fixture_group.update_dmx(dmx)
-        elif self.all_lights == True and joy.leftTrigger():
+        elif self.all_lights == True and joy.pressed('leftTrigger'):
             self.all_lights = False
             self.fixture_group.lights_off()
             log.debug('all_off')
-            time.sleep(0.2)
             return self.fixture_group.update_dmx(dmx)
         return dmx
 
 
+# one scene per value of the DMX scene channel
+SCENE_SLOTS = 256
+
+
+class SceneIndex:
+    '''
+    every scene of a show, loaded once at startup and kept in a
+    table indexed by the value of the DMX scene channel.  Each scene
+    has its group resolved and its starting pan/tilt solved, so a cue
+    is a lookup plus copying the solution into the fixture table.
+    Saved scenes are written back to path by a background writer,
+    or handed to writer if one is given.
+    '''
+
+    def __init__(self, show, path=SCENE_FILE, writer=None):
+        self.show = show
+        self.path = path
+        self.writer = writer or YamlWriter(path)
+        self.data = dict()
+        if not os.path.exists(path):
+            print('missing %s, will create when stored.' % path)
+        else:
+            log.info('reading scenes from %s' % path)
+            with open(path, 'r') as stream:
+                self.data = yaml.load(stream, Loader=yaml.FullLoader) or dict()
+
+        for scene_id in self.data:
+            if (not isinstance(scene_id, int) or
+                    not 0 <= scene_id < SCENE_SLOTS):
+                log.warning('ignoring scene %s in %s, ids are 0-%d.' % (
+                    scene_id, path, SCENE_SLOTS - 1))
+
+        self.scenes = [Scene(self.show, i, self.data, self.writer)
+                       for i in range(SCENE_SLOTS)]
+
+    def activate(self, scene_id):
+        ''' the scene for a DMX value, reset to its stored start '''
+        scene = self.scenes[scene_id]
+        scene.cue()
+        return scene
+
+    def close(self):
+        ''' finish writing any saved scenes '''
+        self.writer.close()
+
+
 class Target:
     ''' things on the stage we point to'''
 
@@ -333,22 +503,34 @@ class FixtureGroup:
         self.name = name
         self.fixtures = dict()
         for f in show.fixture_groups[name]:
-            self.fixtures[f] = Fixture(show, f)
+            self.fixtures[f] = show.fixture(f)
+        self.solver = PanTiltSolver(self.fixtures.values())
+        self.trace_id = tracer.name(name)
+
+        # our rows in the show's fixture table, and how to copy
+        # their channels into the output frame
+        self.rows = np.array(
+            [self.fixtures[f].row for f in self.fixtures], dtype=np.intp)
+        self.src, self.dst = show.table.gather(self.rows)
+        self.move_src, self.move_dst = show.table.gather_movement(self.rows)
 
     def point_to(self, target):
         ''' point this group at this target '''
-        log.debug('pointing fixture group %s to %s (%d, %d, %d)' % (
-            self.name, 
-            target.name, target.x, target.y, target.z))
-        for f in self.fixtures:
-            log.debug('  - %s' % self.fixtures[f].name)
-            self.fixtures[f].point_to(target)
+        tracer.record(POINT, self.trace_id, target.x, target.y)
+        self.solver.point_to(target)
 
     def update_dmx(self, dmx):
         ''' update DMX values for all fixtures in this group'''
-        for f in self.fixtures:
-            dmx = self.fixtures[f].update_dmx(dmx)
-        return dmx
+        return self.show.table.render(dmx, self.rows, self.src, self.dst)
+
+    def update_movement(self, dmx):
+        ''' update only the pan/tilt channels of this group '''
+        return self.show.table.render(
+            dmx, self.rows, self.move_src, self.move_dst)
+
+    def invalidate(self):
+        ''' force all fixtures to be rewritten on the next update '''
+        self.show.table.np_dirty[self.rows] = 1
 
     def lights_on(self):
         ''' turn all the lights on '''
@@ -361,68 +543,87 @@ class FixtureGroup:
             self.fixtures[f].off()
 
 
+class Column:
+    '''
+    a Fixture attribute that lives in a FixtureTable column, so every
+    view of the same fixture shares one value.
+    '''
+
+    def __init__(self, name):
+        self.name = name
+
+    def __get__(self, fixture, owner):
+        if fixture is None:
+            return self
+        return getattr(fixture.table, self.name)[fixture.row]
+
+    def __set__(self, fixture, value):
+        getattr(fixture.table, self.name)[fixture.row] = value
+
+
+class Location(Column):
+    ''' a location column, stored as nan when not configured '''
+
+    def __get__(self, fixture, owner):
+        if fixture is None:
+            return self
+        value = getattr(fixture.table, self.name)[fixture.row]
+        return None if math.isnan(value) else value
+
+    def __set__(self, fixture, value):
+        getattr(fixture.table, self.name)[fixture.row] = (
+            math.nan if value is None else value)
+
+
 class Fixture:
     ''' 
     a unique device we manage
+
+    this is a view onto the fixture's row in show.table, all state
+    (position, h/v, channel values) lives there.
     '''
+    __slots__ = ('show', 'table', 'row', 'name', 'data', 'profile',
+                 'channels', 'dmx', 'movement', 'color_values', 'trace_id')
+
+    id = Column('id')
+    universe = Column('universe')
+    start = Column('start')
+    h_range = Column('h_range')
+    v_range = Column('v_range')
+    h_x_axis = Column('h_x_axis')
+    v_z_axis = Column('v_z_axis')
+    h_rotation = Column('h_rotation')
+    v_rotation = Column('v_rotation')
+    inverted = Column('inverted')
+    reversed = Column('reversed')
+    x = Location('x')
+    y = Location('y')
+    z = Location('z')
+    h = Column('h')
+    v = Column('v')
+    dirty = Column('dirty')
 
     def __init__(self, show, name):
         self.show = show
+        self.table = show.table
+        self.row = self.table.rows[name]
         self.name = name
+        self.trace_id = tracer.name(name)
         self.data = self.show.fixtures[self.name]
-        self.id = self.data['id']
-        self.profile = self.data['profile']
-
-        # we can't set up degree per step because we don't know
-        # if we're in 8-bit or 16-bit mode.. so we define the
-        # full range .. and then will interpolate.
-        self.h_range = self.profile['h-range']
-        self.v_range = self.profile['v-range']
-
-        # setup aspect of the fixture... this defines the two
-        # major axis we track
-        #  - x-axis (x,0,0) in h positioning
-        #  - z-axis (0,0,z) in v positioning
-        self.hx = self.profile['hx']
-        self.vz = self.profile['vz']
-        
-        # aspect loaded alraedy into these logicals
-        self.inverted = self.data['inverted']
-        self.reversed = self.data['reversed']
-
-        # multiply to 16 bit value
-        self.h_x_axis = (self.hx * 255)
-        self.v_z_axis = (self.vz * 255)
-
-        # setup rotation management
-        self.h_rotation = -1
-        if ('h-rotation' in self.profile and self.profile['h-rotation'] == 'cw'):
-            self.h_rotation = 1
-        self.v_rotation = -1
-        if ('v-rotation' in self.profile and self.profile['v-rotation'] == 'cw'):
-            self.v_rotation = 1
-
+        self.profile = self.table.profiles[self.row]
         self.channels = self.profile['channels']
+        self.movement = self.table.movement[self.row]
 
-        # location of the instrument.
-        self.x = self.data['x'] if 'x' in self.data else None
-        self.y = self.data['y'] if 'y' in self.data else None
-        self.z = self.data['z'] if 'z' in self.data else None
-
-        # dmx control
-        # we abstract this to make it quicker to store 8 and 16 bit
-        self.h = (255 * 255) / 2
-        self.v = (255 * 255) / 2
-        self.cfocus = self.data['focus'] if 'focus' in self.data else 0
-        # our stored data
-        self.dmx = dict()
+        # our stored data, dirty when it differs from what was
+        # last written to the frame
+        self.dmx = self.table.channels[self.row]
 
         if 'color_values' in self.profile:
             self.color_values = self.profile['color_values']
 
-        # init map values
-        for c in self.channels:
-            self.dmx[c] = 0
+    @property
+    def end(self):
+        return self.start + len(self.channels)
 
     def located(self):
         if (self.x is not None and
@@ -449,7 +650,7 @@ class Fixture:
         if (self.h_rotation == -1 and target.y < self.y):
             ha = 360 - ha
         elif (self.h_rotation == 1 and target.y < self.y):
-            log.debug('reverse %f to %f' % (ha, 360 - ha))
+            log.debug('reverse %f to %f', ha, 360 - ha)
             ha = 360 - ha
 
         # V ... relative to straight vector - height
@@ -489,19 +690,31 @@ class Fixture:
         self.set_coordinates()
 
     def set_coordinates(self):
-        if 'h-coarse' in self.dmx:
-            self.dmx['h-coarse'] = int(self.h / 255)
-            self.dmx['h-fine'] = int(self.h % 255)
-            self.dmx['v-coarse'] = int(self.v / 255)
-            self.dmx['v-fine'] = int(self.v % 255)
-        elif 'h' in self.dmx:
-            self.dmx['h'] = int(self.h / 255)
-            self.dmx['v'] = int(self.v / 255)
+        self.set_coordinate_bytes(
+            clamp(int(self.h / 255), 0, 255),
+            clamp(int(self.h % 255), 0, 255),
+            clamp(int(self.v / 255), 0, 255),
+            clamp(int(self.v % 255), 0, 255))
+
+    def set_coordinate_bytes(self, hc, hf, vc, vf):
+        ''' store h and v already split into coarse and fine bytes '''
+        if self.movement is None:
+            return
+        h_coarse, h_fine, v_coarse, v_fine = self.movement
+        values = self.dmx.values
+        values[h_coarse] = hc
+        values[v_coarse] = vc
+        if h_fine is not None:
+            values[h_fine] = hf
+            values[v_fine] = vf
+        self.dirty = True
 
     def update_dmx(self, dmx):
-        for c in self.channels:
-            dmx_i = self.id + self.channels.index(c) - 1
-            dmx[dmx_i] = clamp(self.dmx[c], 0, 255)
+        ''' write our channels into the frame if they changed '''
+        if not self.dirty:
+            return dmx
+        dmx[self.start:self.end] = self.dmx.values
+        self.dirty = False
         return dmx
 
     def get_position(self, dmx):
@@ -516,10 +729,11 @@ class Fixture:
     def update_focus(self, value):
         if 'focus' in self.dmx:
             self.dmx['focus'] = clamp(self.dmx['focus'] + value, 0, 255)
+            self.dirty = True
 
     def update_coordinates(self, mod_h, mod_v):
         if mod_h or mod_v:
-            log.debug('moving %s by %d, %d' % (self.name, mod_h, mod_v))
+            tracer.record(MOVE, self.trace_id, mod_h, mod_v)
         self.h = clamp(self.h + mod_h, 0, 65535)
         self.v = clamp(self.v + mod_v, 0, 65535)
         self.set_coordinates()
@@ -536,6 +750,7 @@ class Fixture:
                   'red', 'green', 'blue', 'white']:
             if i in self.dmx:
                 self.dmx[i] = 0
+        self.dirty = True
 
     def on(self, color='white'):
         # enable light
@@ -560,3 +775,5 @@ class Fixture:
         if ((color == 'white' or color == 'blue') and
                 'red' in self.dmx):
             self.dmx['blue'] = 255
+        self.dirty = True
+
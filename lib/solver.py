@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Library General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright (C) 2018 Branson Matheson
+
+import numpy as np
+
+
+def _angle(a, b):
+    '''
+    angle in degrees between each row of a and b, as
+    vectors.Vector.angle() computes it.  Zero length vectors give 0.
+    '''
+    dot = (a[:, 0] * b[:, 0] + a[:, 1] * b[:, 1]) + a[:, 2] * b[:, 2]
+    mag = (np.sqrt((a[:, 0] ** 2 + a[:, 1] ** 2) + a[:, 2] ** 2) *
+           np.sqrt((b[:, 0] ** 2 + b[:, 1] ** 2) + b[:, 2] ** 2))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cos = np.where(mag > 0, dot / mag, 1.0)
+    return np.degrees(np.arccos(np.clip(cos, -1.0, 1.0)))
+
+
+def _byte(a):
+    ''' int() of each value, clamped to a DMX byte '''
+    return np.clip(np.trunc(a), 0, 255).astype(np.uint8)
+
+
+class PanTiltSolver:
+    '''
+    pan/tilt for a set of fixtures against one target, solved for
+    all of them at once.
+
+    Everything Fixture.point_to() reads from a fixture is copied into
+    arrays when the solver is built; point_to() then does the same
+    math as Fixture.point_to()/set_angles() across the whole set and
+    writes h, v and the movement channels straight into the fixture
+    table.  Fixtures without a location are left out, there is
+    nothing to aim from.
+    '''
+
+    def __init__(self, fixtures):
+        self.fixtures = [f for f in fixtures if f.located()]
+        self.pos = np.array(
+            [f.location() for f in self.fixtures],
+            dtype=float).reshape(-1, 3)
+        self.h_x_axis = self.column('h_x_axis')
+        self.v_z_axis = self.column('v_z_axis')
+        self.h_range = self.column('h_range')
+        self.v_range = self.column('v_range')
+        self.h_rotation = self.column('h_rotation')
+        self.reversed = self.column('reversed', bool)
+        self.inverted = self.column('inverted', bool)
+
+        # where the results go in the fixture table: our rows, and
+        # the value index of each movement channel for the fixtures
+        # that have them (8 bit fixtures have no fine channel)
+        self.table = self.fixtures[0].table if self.fixtures else None
+        self.rows = np.array([f.row for f in self.fixtures], dtype=np.intp)
+        moving, fine = [], []
+        h_coarse, h_fine, v_coarse, v_fine = [], [], [], []
+        for i, f in enumerate(self.fixtures):
+            if f.movement is None:
+                continue
+            base = self.table.base[f.row]
+            moving.append(i)
+            h_coarse.append(base + f.movement[0])
+            v_coarse.append(base + f.movement[2])
+            if f.movement[1] is not None:
+                fine.append(i)
+                h_fine.append(base + f.movement[1])
+                v_fine.append(base + f.movement[3])
+        self.moving = np.array(moving, dtype=np.intp)
+        self.fine = np.array(fine, dtype=np.intp)
+        self.h_coarse = np.array(h_coarse, dtype=np.intp)
+        self.h_fine = np.array(h_fine, dtype=np.intp)
+        self.v_coarse = np.array(v_coarse, dtype=np.intp)
+        self.v_fine = np.array(v_fine, dtype=np.intp)
+
+    def column(self, attr, dtype=float):
+        return np.array(
+            [getattr(f, attr) for f in self.fixtures], dtype=dtype)
+
+    def solve(self, x, y, z):
+        ''' h and v (0-65535 scale, unclamped) for each fixture '''
+        pos = self.pos
+        target = np.array([x, y, z], dtype=float)
+
+        # target vector, and the h reference vector which runs
+        # along x from the fixture down to the floor
+        vt = target - pos
+        vx = np.empty_like(pos)
+        vx[:, 0] = 100.0
+        vx[:, 1] = 0.0
+        vx[:, 2] = -pos[:, 2]
+        ha = _angle(vx, vt)
+
+        # flip angle if we pass the y axis
+        ha = np.where(y < pos[:, 1], 360 - ha, ha)
+
+        # V ... relative to the target vector flattened to our height
+        if z <= 0:
+            va = np.zeros(len(pos))
+        else:
+            vz = vt.copy()
+            vz[:, 2] = 0.0
+            va = _angle(vt, vz)
+
+        # flip angles if we're reversed or inverted
+        ha = np.where(self.reversed, np.abs(np.mod(ha + 180, 360)), ha)
+        ha = np.where(self.inverted & ~self.reversed,
+                      np.abs(np.mod(180 - ha, 180)), ha)
+        va = np.where(self.inverted, np.abs(np.mod(90 - va, 180)), va)
+
+        h = (self.h_x_axis + ((ha * 65535) / self.h_range) *
+             (self.h_rotation * -1))
+        v = self.v_z_axis + ((va * 65535) / self.v_range)
+        return h, v
+
+    def presolve(self, target):
+        ''' everything point_to() would store for target '''
+        h, v = self.solve(target.x, target.y, target.z)
+        # split into coarse/fine, as set_coordinates() would
+        return (h, v,
+                _byte(h[self.moving] / 255),
+                _byte(v[self.moving] / 255),
+                _byte(np.mod(h[self.fine], 255)),
+                _byte(np.mod(v[self.fine], 255)))
+
+    def apply(self, solution):
+        ''' store a presolve() result in the fixture table '''
+        if not self.fixtures:
+            return
+        h, v, h_coarse, v_coarse, h_fine, v_fine = solution
+        table = self.table
+        table.np_h[self.rows] = h
+        table.np_v[self.rows] = v
+        values = table.np_values
+        values[self.h_coarse] = h_coarse
+        values[self.v_coarse] = v_coarse
+        values[self.h_fine] = h_fine
+        values[self.v_fine] = v_fine
+        table.np_dirty[self.rows[self.moving]] = 1
+
+    def point_to(self, target):
+        ''' aim every fixture at target '''
+        if not self.fixtures:
+            return
+        self.apply(self.presolve(target))
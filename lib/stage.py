@@ -17,12 +17,12 @@
 # Copyright (C) 2018 Branson Matheson
 
 import os
-import time
 import logging as log
+import numpy as np
 import yaml
 
-from .show import Fixture
-
+from .motion import (
+    step, SPEED_RATE, SPEED_REPEAT, FOCUS_REPEAT, MAX_PAN_VELOCITY)
 
 
 STAGE_FILE = 'stages.yml'
@@ -60,83 +60,100 @@ class Stage:
         self.fixtures = self.stage['fixtures']
         self.show = show
         self.speed = 100
+        self.max_velocity = show.config.joystick.get(
+            'max_pan_velocity', MAX_PAN_VELOCITY)
         self.all_lights = False
 
 
         # create objects to work with
         # TODO: add stored info here.
         for fname in self.show.fixtures:
-            self.fixtures[fname] = Fixture(self.show, fname)
-        self.fp = FixturePair(self.fixtures)
+            self.fixtures[fname] = self.show.fixture(fname)
+
+        # fixtures share state with every scene, so the working pair
+        # (which aims and lights its fixtures) is only set up once
+        # we start editing.
+        self.fp = None
+
+        # we edit every fixture, so render all of them
+        self.rows = np.array(
+            [self.fixtures[f].row for f in self.show.fixtures],
+            dtype=np.intp)
+        self.src, self.dst = self.show.table.gather(self.rows)
 
     def handle_fp_cmds(self, joy):
         # rotate thru working pairs
-        if joy.leftBumper():
+        if joy.pressed('leftBumper'):
             log.debug('dec fp')
             self.fp.b.off()
             self.fp.prev()
-            time.sleep(0.2)
 
-        elif joy.rightBumper():
+        elif joy.pressed('rightBumper'):
             log.debug('inc fp')
             self.fp.a.off()
             self.fp.next()
             self.fp.set_pair()
-            time.sleep(0.2)
 
-        if joy.dpadRight():
+        # focus, repeats while held
+        if joy.pressed('dpadRight', repeat=FOCUS_REPEAT):
             self.fp.a.update_focus(+8)
-        elif joy.dpadLeft():
+        elif joy.pressed('dpadLeft', repeat=FOCUS_REPEAT):
             self.fp.a.update_focus(-8)
 
     def handle_movement(self, joy):
-        # change speed
-        if joy.dpadUp():
+        # change speed, repeats while held
+        if joy.pressed('dpadUp', repeat=SPEED_REPEAT):
             self.speed = clamp(self.speed + 50, 25, 500)
-            log.debug(' inc speed: %d' % self.speed)
+            log.debug(' inc speed: %d', self.speed)
 
-        elif joy.dpadDown():
+        elif joy.pressed('dpadDown', repeat=SPEED_REPEAT):
             self.speed = clamp(self.speed - 50, 25, 500)
-            log.debug(' dec speed: %d' % self.speed)
-         # handle movement
+            log.debug(' dec speed: %d', self.speed)
+        # handle movement, speed is pan/tilt a step, integrated over
+        # the time since the last frame
+        rate = self.speed * SPEED_RATE
         lx = joy.leftX()
         ly = joy.leftY()
         rx = joy.rightX()
         ry = joy.rightY()
         if lx or ly:
             self.fp.a.update_coordinates(
-                (self.speed * lx),
-                (self.speed * ly))
+                *step(rate, lx, ly, joy.dt, self.max_velocity))
         if rx or ry:
             self.fp.b.update_coordinates(
-                (self.speed * rx),
-                (self.speed * ry))
+                *step(rate, rx, ry, joy.dt, self.max_velocity))
 
     def handle_lights(self, joy):
         # handle light
-        if self.all_lights == False and joy.rightTrigger():
+        # the trigger toggles, so only act as it is pulled
+        if not joy.pressed('rightTrigger'):
+            return
+
+        if self.all_lights == False:
             self.all_lights = True
             for fixture in self.fixtures:
                 self.fixtures[fixture].on()
             log.debug('all_on')
-            time.sleep(0.2)
 
-        elif self.all_lights == True and joy.rightTrigger():
+        else:
             self.all_lights = False
             for fixture in self.fixtures:
                 self.fixtures[fixture].off()
             log.debug('all_off')
-            time.sleep(0.2)
 
     def edit(self, joy, dmx):
+        if self.fp is None:
+            self.fp = FixturePair(self.fixtures)
         self.handle_fp_cmds(joy)
         self.handle_movement(joy)
         self.handle_lights(joy)
 
-        # walk the fixtures and handle any all config
-        for fixture in self.fixtures:
-            dmx = self.fixtures[fixture].update_dmx(dmx)
-        return dmx
+        # write out any fixtures that changed
+        return self.show.table.render(dmx, self.rows, self.src, self.dst)
+
+    def invalidate(self):
+        ''' the frame was replaced, rewrite our fixtures next update '''
+        self.show.table.np_dirty[self.rows] = 1
 
 
 class FixturePair(Stage):
@@ -160,7 +177,7 @@ class FixturePair(Stage):
         # -1 because DMX ids are indexed at 1 .. and arrays at 0
         id_a = ((self.id) % len(self.fixture_names)) - 1
         id_b = ((self.id + 1) % len(self.fixture_names)) - 1
-        log.debug('fp: %d %d' % (id_a, id_b))
+        log.debug('fp: %d %d', id_a, id_b)
         self.a = self.fixtures[self.fixture_names[id_a]]
         self.b = self.fixtures[self.fixture_names[id_b]]
         if self.a.located() and self.b.located():
@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Library General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright (C) 2018 Branson Matheson
+
+import glob
+import logging as log
+import threading
+
+# the xpad driver's LED, which takes the same codes as xboxdrv --led
+LED_GLOB = '/sys/class/leds/xpad*/brightness'
+
+# LED codes for the modes
+LED_BLINK = 1
+LED_ROTATE = 10
+LED_ALTERNATE = 13
+
+
+def find_led():
+    ''' the first controller LED, or None '''
+    leds = sorted(glob.glob(LED_GLOB))
+    return leds[0] if leds else None
+
+
+def open_led(config):
+    ''' the LED in joystick: led:, found if unset, none if false '''
+    path = config.get('led')
+    if path is None:
+        path = find_led()
+    return StatusLed(path or None)
+
+
+class StatusLed:
+    '''
+    controller LED changes, written from a thread.
+
+    set() only stores the newest code and wakes the writer, so a
+    mode change never waits on the controller.  Codes set while the
+    writer is busy are replaced by the newest one, and a code already
+    showing is not written again.  The LED is written through the
+    kernel's LED class (path), the input stream is never touched.
+    With no path the codes are only kept, for stats.
+    '''
+
+    def __init__(self, path=None):
+        self.path = path
+        self.code = None        # newest code asked for
+        self.shown = None       # code last written
+        self.closing = False
+        self.wake = threading.Condition()
+
+        # stats
+        self.requested = 0
+        self.written = 0
+        self.superseded = 0
+        self.errors = 0
+
+        if self.path:
+            log.info('controller LED is %s' % self.path)
+            self.writer = threading.Thread(
+                target=self.run, name='status', daemon=True)
+            self.writer.start()
+        else:
+            log.info('no controller LED found, mode changes are not shown')
+
+    def set(self, code):
+        ''' show code on the LED, returns at once '''
+        with self.wake:
+            if self.code is not None and self.code != self.shown:
+                self.superseded += 1
+            self.code = code
+            self.requested += 1
+            if not self.path:
+                self.shown = code
+            self.wake.notify()
+
+    def run(self):
+        ''' writer thread: write the newest code whenever it changes '''
+        while True:
+            with self.wake:
+                while not self.closing and self.code == self.shown:
+                    self.wake.wait()
+                if self.closing:
+                    return
+                code = self.code
+            try:
+                with open(self.path, 'w') as led:
+                    led.write('%d\n' % code)
+                self.written += 1
+            except OSError as e:
+                self.errors += 1
+                if self.errors == 1:
+                    log.warning('could not set LED %s: %s' % (self.path, e))
+            with self.wake:
+                self.shown = code
+
+    def stats(self):
+        return {
+            'code': -1 if self.code is None else self.code,
+            'requested': self.requested,
+            'written': self.written,
+            'superseded': self.superseded,
+            'errors': self.errors,
+        }
+
+    def close(self):
+        with self.wake:
+            self.closing = True
+            self.wake.notify()
@@ -0,0 +1,215 @@
+#!/usr/bin/env python
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Library General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright (C) 2018 Branson Matheson
+
+import array
+import math
+
+import numpy as np
+
+from .config import UNIVERSE_SIZE
+
+
+def clamp(n, minn, maxn):
+    return max(min(maxn, n), minn)
+
+
+class Channels:
+    '''
+    the channel values of one fixture, laid out in DMX order so the
+    whole footprint can be copied into a frame with one slice.
+    Indexed by channel name through the offsets compiled with the
+    profile; values are clamped to a byte as they are stored.
+    '''
+
+    def __init__(self, offsets, values):
+        self.offsets = offsets
+        self.values = values
+
+    def __contains__(self, name):
+        return name in self.offsets
+
+    def __getitem__(self, name):
+        return self.values[self.offsets[name]]
+
+    def __setitem__(self, name, value):
+        self.values[self.offsets[name]] = clamp(int(value), 0, 255)
+
+
+class FixtureTable:
+    '''
+    every fixture in a show, stored by column.
+
+    One row per fixture, each column an array so a fixture is a row
+    index rather than an object full of attributes.  Channel values
+    for all fixtures sit back to back in one byte array (values), and
+    the numeric columns have NumPy views over the same memory so a
+    group can be solved and rendered into a universe with array
+    operations.  Fixture objects are thin views onto a row.
+
+    Output universes are laid end to end in one frame in the order
+    of universes, so a fixture's start is its channel in that frame
+    and rendering a group that spans universes is still one copy.
+    '''
+
+    def __init__(self, fixtures, universes):
+        self.names = list(fixtures.keys())
+        self.rows = dict()
+        self.slots = dict((u, i) for i, u in enumerate(universes))
+
+        # static config
+        self.id = array.array('i')
+        self.universe = array.array('i')
+        self.start = array.array('i')   # first channel in the frame
+        self.base = array.array('i')    # first channel in values
+        self.size = array.array('i')
+        self.x = array.array('d')       # nan if not located
+        self.y = array.array('d')
+        self.z = array.array('d')
+        self.h_range = array.array('d')
+        self.v_range = array.array('d')
+        self.h_x_axis = array.array('d')
+        self.v_z_axis = array.array('d')
+        self.h_rotation = array.array('b')
+        self.v_rotation = array.array('b')
+        self.inverted = array.array('B')
+        self.reversed = array.array('B')
+        self.profiles = list()
+        self.movement = list()
+
+        # working state
+        self.h = array.array('d')
+        self.v = array.array('d')
+        self.dirty = array.array('B')
+
+        base = 0
+        for row, name in enumerate(self.names):
+            data = fixtures[name]
+            profile = data['profile']
+            self.rows[name] = row
+            self.profiles.append(profile)
+
+            size = len(profile['channels'])
+            self.id.append(data['id'])
+            self.universe.append(data['universe'])
+            self.start.append(
+                self.slots[data['universe']] * UNIVERSE_SIZE +
+                data['id'] - 1)
+            self.base.append(base)
+            self.size.append(size)
+            base += size
+
+            # location of the instrument.
+            for axis in ('x', 'y', 'z'):
+                getattr(self, axis).append(
+                    data[axis] if data.get(axis) is not None else math.nan)
+
+            # we can't set up degree per step because we don't know
+            # if we're in 8-bit or 16-bit mode.. so we define the
+            # full range .. and then will interpolate.
+            self.h_range.append(profile['h-range'])
+            self.v_range.append(profile['v-range'])
+
+            # setup aspect of the fixture... this defines the two
+            # major axis we track, multiplied to a 16 bit value
+            #  - x-axis (x,0,0) in h positioning
+            #  - z-axis (0,0,z) in v positioning
+            self.h_x_axis.append(profile['hx'] * 255)
+            self.v_z_axis.append(profile['vz'] * 255)
+
+            # setup rotation management
+            self.h_rotation.append(
+                1 if profile.get('h-rotation') == 'cw' else -1)
+            self.v_rotation.append(
+                1 if profile.get('v-rotation') == 'cw' else -1)
+
+            # offsets of the movement channels, 16 or 8 bit
+            offsets = profile['offsets']
+            if 'h-coarse' in offsets:
+                self.movement.append(
+                    (offsets['h-coarse'], offsets['h-fine'],
+                     offsets['v-coarse'], offsets['v-fine']))
+            elif 'h' in offsets:
+                self.movement.append((offsets['h'], None, offsets['v'], None))
+            else:
+                self.movement.append(None)
+
+            # aspect loaded already into these logicals
+            self.inverted.append(1 if data['inverted'] else 0)
+            self.reversed.append(1 if data['reversed'] else 0)
+
+            # dmx control
+            # we abstract this to make it quicker to store 8 and 16 bit
+            self.h.append((255 * 255) / 2)
+            self.v.append((255 * 255) / 2)
+            self.dirty.append(1)
+
+        self.values = array.array('B', bytes(base))
+        view = memoryview(self.values)
+        self.channels = [
+            Channels(self.profiles[r]['offsets'],
+                     view[self.base[r]:self.base[r] + self.size[r]])
+            for r in range(len(self.names))]
+
+        # NumPy views, these share memory with the arrays above
+        self.np_values = np.frombuffer(self.values, dtype=np.uint8)
+        self.np_h = np.frombuffer(self.h, dtype=np.float64)
+        self.np_v = np.frombuffer(self.v, dtype=np.float64)
+        self.np_dirty = np.frombuffer(self.dirty, dtype=np.uint8)
+
+    def __len__(self):
+        return len(self.names)
+
+    def gather(self, rows):
+        '''
+        index arrays that copy the footprints of rows from values
+        (src) into the output frame (dst).
+        '''
+        src = [np.arange(self.base[r], self.base[r] + self.size[r])
+               for r in rows]
+        dst = [np.arange(self.start[r], self.start[r] + self.size[r])
+               for r in rows]
+        if not src:
+            return (np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp))
+        return np.concatenate(src), np.concatenate(dst)
+
+    def gather_movement(self, rows):
+        '''
+        like gather(), but only the pan/tilt channels of rows, so the
+        console keeps every other channel.
+        '''
+        src = list()
+        dst = list()
+        for r in rows:
+            if self.movement[r] is None:
+                continue
+            for offset in self.movement[r]:
+                if offset is not None:
+                    src.append(self.base[r] + offset)
+                    dst.append(self.start[r] + offset)
+        return (np.array(src, dtype=np.intp), np.array(dst, dtype=np.intp))
+
+    def render(self, dmx, rows, src, dst):
+        '''
+        write the footprints of rows into the output frame dmx if any
+        of them changed, src/dst come from gather(rows).
+        '''
+        if not self.np_dirty[rows].any():
+            return dmx
+        out = np.frombuffer(dmx, dtype=np.uint8)
+        out[dst] = self.np_values[src]
+        self.np_dirty[rows] = 0
+        return dmx
@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Library General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright (C) 2018 Branson Matheson
+
+import logging as log
+import os
+import struct
+import time
+
+# events kept, the oldest are overwritten
+TRACE_SIZE = 8192
+TRACE_DIR = 'data'
+
+# time, event, then an integer and two floats whose meaning depends
+# on the event
+EVENT = struct.Struct('<dBxxxiff')
+
+# events, and what their values hold
+MODE = 1        # mode, scene, operation
+JOY_MODE = 2    # joystick mode
+BUTTON = 3      # button name, 1 pressed / -1 released
+TARGET = 4      # scene, x, y
+POINT = 5       # group name, target x, y
+MOVE = 6        # fixture name, pan, tilt change
+SEND = 7        # universe, 1 sent / 0 refused by the backend
+OVERRUN = 8     # tick, milliseconds it took
+RELOAD = 9      # -, milliseconds to swap
+
+NAMES = {
+    MODE: ('mode', 'mode', 'scene', 'op'),
+    JOY_MODE: ('joy_mode', 'mode', None, None),
+    BUTTON: ('button', 'button', 'edge', None),
+    TARGET: ('target', 'scene', 'x', 'y'),
+    POINT: ('point', 'group', 'x', 'y'),
+    MOVE: ('move', 'fixture', 'pan', 'tilt'),
+    SEND: ('send', 'universe', 'sent', None),
+    OVERRUN: ('overrun', 'tick', 'ms', None),
+    RELOAD: ('reload', None, 'ms', None),
+}
+
+# events whose integer is a name() id
+NAMED = (BUTTON, POINT, MOVE)
+
+
+class TraceBuffer:
+    '''
+    a fixed-size ring of binary trace events.
+
+    record() packs an event straight into a preallocated buffer, no
+    string is formatted and the ring never grows, so it can be left
+    on in the frame loop where a log.debug() could not.  Strings
+    (group and fixture names) are turned into small integers once by
+    name().  dump() decodes the ring to a text file, oldest first.
+    '''
+
+    def __init__(self, size=TRACE_SIZE, directory=TRACE_DIR,
+                 clock=time.monotonic):
+        self.directory = directory
+        self.clock = clock
+        self.names = dict()
+        self.labels = list()
+        self.resize(size)
+
+    def resize(self, size):
+        ''' start a new, empty ring of size events '''
+        self.size = max(int(size), 1)
+        self.buffer = bytearray(self.size * EVENT.size)
+        self.count = 0
+
+    def name(self, label):
+        ''' a small integer standing for label in events '''
+        n = self.names.get(label)
+        if n is None:
+            n = self.names[label] = len(self.labels)
+            self.labels.append(label)
+        return n
+
+    def record(self, event, a=0, x=0.0, y=0.0):
+        EVENT.pack_into(self.buffer, (self.count % self.size) * EVENT.size,
+                        self.clock(), event, a, x, y)
+        self.count += 1
+
+    def events(self):
+        ''' (time, event, a, x, y) for everything in the ring, oldest first '''
+        first = max(0, self.count - self.size)
+        for i in range(first, self.count):
+            yield EVENT.unpack_from(
+                self.buffer, (i % self.size) * EVENT.size)
+
+    def format(self, when, event, a, x, y):
+        name, a_name, x_name, y_name = NAMES.get(
+            event, ('event%d' % event, 'a', 'x', 'y'))
+        if event in NAMED and 0 <= a < len(self.labels):
+            a = self.labels[a]
+        fields = ['%.6f' % when, '%-8s' % name]
+        for field, value in ((a_name, a), (x_name, x), (y_name, y)):
+            if field is None:
+                continue
+            if isinstance(value, float):
+                value = '%g' % value
+            fields.append('%s=%s' % (field, value))
+        return ' '.join(fields)
+
+    def dump(self, path=None, reason='dump'):
+        ''' write the ring to path, by default a new file in directory '''
+        if path is None:
+            path = os.path.join(self.directory, 'trace-%s-%s.txt' % (
+                time.strftime('%Y%m%d-%H%M%S'), reason))
+        try:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            with open(path, 'w') as stream:
+                stream.write('# %s, %d of %d events\n' % (
+                    reason, min(self.count, self.size), self.count))
+                for e in self.events():
+                    stream.write(self.format(*e) + '\n')
+        except OSError as e:
+            log.error('could not write trace %s: %s' % (path, e))
+            return None
+        log.info('trace written to %s' % path)
+        return path
+
+
+# the trace everything records to, like the logging module's root
+# logger.  Set up from trace: in the config.
+tracer = TraceBuffer()
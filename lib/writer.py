@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Library General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright (C) 2018 Branson Matheson
+
+import copy
+import logging as log
+import os
+import stat
+import tempfile
+import threading
+import time
+
+import yaml
+
+# mode a new file gets, read once here as reading the umask briefly
+# changes it for every thread
+_umask = os.umask(0)
+os.umask(_umask)
+NEW_FILE_MODE = 0o666 & ~_umask
+
+
+class YamlWriter:
+    '''
+    writes a YAML file from a background thread.
+
+    store() takes a copy of the data and returns at once, so it is
+    safe to call from the frame loop.  If more stores arrive while a
+    write is in progress only the newest is written, and each write
+    goes to a temporary file in the same directory that is renamed
+    over the old one, so a crash never leaves a half written file.
+    '''
+
+    def __init__(self, path, clock=time.monotonic):
+        self.path = path
+        self.clock = clock
+        self.cond = threading.Condition()
+        self.pending = None     # newest data not yet written
+        self.requested = None   # when the oldest pending store came in
+        self.busy = False
+        self.running = True
+
+        # stats
+        self.stores = 0
+        self.writes = 0
+        self.coalesced = 0
+        self.failed = 0
+        self.last_write = 0.0   # seconds spent writing the last file
+        self.max_write = 0.0
+        self.max_latency = 0.0  # store() to file on disk
+        self.written = None     # (mtime, size) of the file we last wrote
+
+        self.thread = threading.Thread(
+            target=self.run, name='writer %s' % path, daemon=True)
+        self.thread.start()
+
+    def store(self, data):
+        ''' queue data to be written, replacing anything still queued '''
+        snapshot = copy.deepcopy(data)
+        with self.cond:
+            self.stores += 1
+            if self.pending is not None:
+                self.coalesced += 1
+            else:
+                self.requested = self.clock()
+            self.pending = snapshot
+            self.cond.notify()
+
+    def run(self):
+        while True:
+            with self.cond:
+                while self.running and self.pending is None:
+                    self.cond.wait()
+                if self.pending is None:
+                    return
+                data, self.pending = self.pending, None
+                requested = self.requested
+                self.busy = True
+            try:
+                self.write(data, requested)
+            finally:
+                with self.cond:
+                    self.busy = False
+                    self.cond.notify_all()
+
+    def mode(self):
+        ''' permissions of the file now, or those of a new file '''
+        try:
+            return stat.S_IMODE(os.stat(self.path).st_mode)
+        except FileNotFoundError:
+            return NEW_FILE_MODE
+
+    def write(self, data, requested):
+        ''' dump data to a temporary file and rename it into place '''
+        start = self.clock()
+        directory = os.path.dirname(self.path) or '.'
+        try:
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(
+                dir=directory, prefix='.%s.' % os.path.basename(self.path))
+            try:
+                # mkstemp makes the file 0600, keep the mode we replace
+                os.fchmod(fd, self.mode())
+                with os.fdopen(fd, 'w') as stream:
+                    yaml.dump(data, stream, default_flow_style=False)
+                    stream.flush()
+                    os.fsync(stream.fileno())
+                os.replace(tmp, self.path)
+                st = os.stat(self.path)
+                self.written = (st.st_mtime_ns, st.st_size)
+            except BaseException:
+                os.unlink(tmp)
+                raise
+        except Exception as e:
+            self.failed += 1
+            log.error('could not write %s: %s' % (self.path, e))
+            return
+
+        end = self.clock()
+        self.writes += 1
+        self.last_write = end - start
+        self.max_write = max(self.max_write, self.last_write)
+        self.max_latency = max(self.max_latency, end - requested)
+        log.info('wrote %s with %d entries in %.1fms.' % (
+            self.path, len(data), self.last_write * 1000))
+
+    def flush(self, timeout=None):
+        ''' wait until everything stored so far is on disk '''
+        with self.cond:
+            return self.cond.wait_for(
+                lambda: self.pending is None and not self.busy, timeout)
+
+    def close(self, timeout=None):
+        ''' write anything pending and stop the thread '''
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+        self.thread.join(timeout)
+
+    def stats(self):
+        return {
+            'stores': self.stores,
+            'writes': self.writes,
+            'coalesced': self.coalesced,
+            'failed': self.failed,
+            'last_write_ms': self.last_write * 1000,
+            'max_write_ms': self.max_write * 1000,
+            'max_latency_ms': self.max_latency * 1000,
+        }
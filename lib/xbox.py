@@ -12,6 +12,7 @@ Example usage:
 
     import xbox
     joy = xbox.Joystick()         #Initialize joystick
+    joy.refresh()                 #Decode the newest xboxdrv line into joy.state
     
     if joy.A():                   #Test state of the A button (1=pressed, 0=not pressed)
         print 'A button pressed'
@@ -29,6 +30,11 @@ import select
 import time
 import logging as log
 import sys
+import threading
+
+from .joystate import JoyState, DEADZONE, axis_scale
+from .metrics import Histogram
+from .status import LED_GLOB, open_led
 
 xboxdrv_options = [
 #    '--no-uinput',
@@ -43,9 +49,12 @@ class Joystick:
 
     """Initializes the joystick/wireless receiver, launching 'xboxdrv' as a subprocess
     and checking that the wired joystick or wireless receiver is attached.
-    The refreshRate determines the maximnum rate at which events are polled from xboxdrv.
-    Calling any of the Joystick methods will cause a refresh to occur, if refreshTime has elapsed.
-    Routinely call a Joystick method, at least once per second, to avoid overfilling the event buffer.
+    A reader thread drains xboxdrv's output as it arrives, decodes each line once into a
+    JoyState and publishes the newest one.  refresh() only picks up that reference (no
+    select or readline), into self.state, and the button and stick methods only read
+    self.state.  refreshRate is kept for compatibility, lines are no longer polled.
+    LED changes go to a StatusLed, xboxdrv keeps running and only sets
+    the LED when it is started.
 
     Usage:
         joy = xbox.Joystick()
@@ -56,6 +65,25 @@ class Joystick:
         self.debug = debug
         self.cid = config.get('controller_id')
         self.wid = config.get('wireless_id')
+        self.deadzone = config.get('deadzone', DEADZONE)
+        self.closing = False
+        self.error = None
+
+        # lines read, states that were replaced by a newer one before
+        # refresh() took them, and how old a state is when taken
+        self.lines = 0
+        self.states = 0
+        self.superseded = 0
+        self.latency = Histogram(
+            'dmxfs_joystick_latency_seconds',
+            'time from xboxdrv writing a state to a frame using it')
+        self.status = open_led(config)
+        if self.status.path is None and config.get('led') is None:
+            # xboxdrv takes the controller from the xpad driver, and
+            # with it the LED class
+            log.warning('no controller LED in %s, with xboxdrv the LED '
+                        'is only set when it (re)starts.  Use joystick: '
+                        'backend: evdev to show mode changes.' % LED_GLOB)
         self.controller_check() 
         self.connect()
 
@@ -89,8 +117,13 @@ class Joystick:
             run_options.append('--wid')
             run_options.append('%d' % self.wid)
 
+        # the LED class may be gone, xboxdrv sets the mode we are in
+        if self.status.code is not None:
+            run_options += ['--led', '%d' % self.status.code]
+
         run_options = run_options + xboxdrv_options + options
         log.debug('running %s' % (" ".join(run_options)))
+        self.closing = False
         self.proc = subprocess.Popen(
             run_options,
             stdout=subprocess.PIPE)
@@ -99,12 +132,11 @@ class Joystick:
         # will be set to True once controller is detected and stays on
         self.connectStatus = False
         self.reading = '0' * 140  # initialize stick readings to all zeros
-        #
-        # absolute time when next refresh (read results from xboxdrv stdout
-        # pipe) is to occur
-        self.refreshTime = 0
-        # joystick refresh is to be performed 30 times per sec by default
-        self.refreshDelay = 1.0 / self.refreshRate
+        self.state = JoyState.parse(self.reading, self.deadzone)
+        # the reader thread replaces this tuple as a whole, so refresh()
+        # always sees a matching sequence, state, line and time
+        self.published = (0, self.state, self.reading, None)
+        self.consumed = 0
         #
         # Read responses from 'xboxdrv' for upto 2 seconds, looking for
         # controller/receiver to respond
@@ -125,6 +157,7 @@ class Joystick:
                     found = True
                     self.connectStatus = True
                     self.reading = response
+                    self.state = JoyState.parse(response, self.deadzone)
 
         # if the controller wasn't found, then halt
         if not found:
@@ -132,45 +165,79 @@ class Joystick:
             raise IOError(
                 'Unable to detect Xbox controller/receiver - Run python as sudo')
 
+        self.reader = threading.Thread(
+            target=self.read, args=(self.pipe,), name='joystick', daemon=True)
+        self.reader.start()
+
+    def read(self, pipe):
+        ''' reader thread: decode every line from xboxdrv, publish the newest '''
+        seq = 0
+        while True:
+            try:
+                response = pipe.readline()
+            except (OSError, ValueError):
+                response = b''
+            if pipe is not getattr(self, 'pipe', None):
+                # disconnected, a new reader has the new pipe
+                return
+            # A zero length response means controller has been unplugged.
+            if len(response) == 0:
+                if not self.closing and pipe is getattr(self, 'pipe', None):
+                    self.error = IOError('Xbox controller disconnected from USB')
+                return
+            self.lines += 1
+            # Valid controller response will be 140 chars.
+            if len(response) == 140:
+                seq += 1
+                self.published = (seq, JoyState.parse(response, self.deadzone),
+                                  response, time.monotonic())
+                self.connectStatus = True
+            else:  # Any other response means we have lost wireless or controller battery
+                self.connectStatus = False
+
     def disconnect(self):
         log.info('disconnecting from xboxdrv')
+        # the reader sees EOF as we stop xboxdrv, it must not take
+        # that for the controller being unplugged
+        self.closing = True
+        del self.pipe
         self.proc.terminate()
         self.proc.wait()
         del self.proc
-        del self.pipe
 
-    """Used by all Joystick methods to read the most recent events from xboxdrv.
-    The refreshRate determines the maximum frequency with which events are checked.
-    If a valid event response is found, then the controller is flagged as 'connected'.
+    """Take the newest state the reader thread published, True if it is new since the
+    last refresh.  Raises IOError once the controller has been unplugged.
     """
 
     def refresh(self):
-        # Refresh the joystick readings based on regular defined freq
-        if self.refreshTime < time.time():
-            self.refreshTime = time.time() + self.refreshDelay  # set next refresh time
-            # If there is text available to read from xboxdrv, then read it.
-            readable, writeable, exception = select.select(
-                [self.pipe], [], [], 0)
-            if readable:
-                # Read every line that is available.  We only need to decode the
-                # last one.
-                while readable:
-                    response = self.pipe.readline()
-                    # print(f'response: %s' % response)
-                    # A zero length response means controller has been
-                    # unplugged.
-                    if len(response) == 0:
-                        raise IOError('Xbox controller disconnected from USB')
-                    readable, writeable, exception = select.select(
-                        [self.pipe], [], [], 0)
-                # Valid controller response will be 140 chars.
-                if len(response) == 140:
-                    self.connectStatus = True
-                    self.reading = response
-                    return True
-                else:  # Any other response means we have lost wireless or controller battery
-                    self.connectStatus = False
-        return False
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+        seq, state, reading, received = self.published
+        if seq == self.consumed:
+            return False
+        self.states += 1
+        self.superseded += seq - self.consumed - 1
+        self.consumed = seq
+        self.state = state
+        self.reading = reading
+        self.latency.observe(time.monotonic() - received)
+        return True
+
+    def register(self, metrics):
+        ''' report our latency and stats through metrics '''
+        metrics.add(self.latency)
+        metrics.stats('dmxfs_joystick', self.stats)
+        metrics.stats('dmxfs_joystick_led', self.status.stats)
+
+    def stats(self):
+        return {
+            'lines': self.lines,
+            'states': self.states,
+            'superseded': self.superseded,
+            'latency_avg_ms': (self.latency.sum * 1000 /
+                               max(self.latency.count, 1)),
+        }
 
     """Return a status of True, when the controller is actively connected.
     Either loss of wireless signal or controller powering off will break connection.  The
@@ -187,148 +254,124 @@ class Joystick:
         self.refresh()
         return self.connectStatus
 
-    # LED operations
+    # LED operations, written in the background
     def led(self, code):
-        self.disconnect()
-        self.connect(['--led', '%d' % code])
+        self.status.set(code)
 
     # Left stick X axis value scaled between -1.0 (left) and 1.0 (right) with
     # deadzone tolerance correction
-    def leftX(self, deadzone=4000):
-        self.refresh()
-        raw = int(self.reading[3:9])
-        return self.axisScale(raw, deadzone)
+    def leftX(self, deadzone=None):
+        return self.axis(0, deadzone)
 
     # Left stick Y axis value scaled between -1.0 (down) and 1.0 (up)
-    def leftY(self, deadzone=4000):
-        self.refresh()
-        raw = int(self.reading[13:19])
-        return self.axisScale(raw, deadzone)
+    def leftY(self, deadzone=None):
+        return self.axis(1, deadzone)
 
     # Right stick X axis value scaled between -1.0 (left) and 1.0 (right)
-    def rightX(self, deadzone=4000):
-        self.refresh()
-        raw = int(self.reading[24:30])
-        return self.axisScale(raw, deadzone)
+    def rightX(self, deadzone=None):
+        return self.axis(2, deadzone)
 
     # Right stick Y axis value scaled between -1.0 (down) and 1.0 (up)
-    def rightY(self, deadzone=4000):
-        self.refresh()
-        raw = int(self.reading[34:40])
-        return self.axisScale(raw, deadzone)
+    def rightY(self, deadzone=None):
+        return self.axis(3, deadzone)
+
+    # Axis n of the state, scaled when it was decoded unless another
+    # deadzone is asked for
+    def axis(self, n, deadzone=None):
+        state = self.state
+        if deadzone is None or deadzone == state.deadzone:
+            return state.axes[n]
+        return axis_scale(state.raw[n], deadzone)
 
     # Scale raw (-32768 to +32767) axis with deadzone correcion
     # Deadzone is +/- range of values to consider to be center stick (ie. 0.0)
     def axisScale(self, raw, deadzone):
-        if abs(raw) < deadzone:
-            return 0.0
-        else:
-            if raw < 0:
-                return (raw + deadzone) / (32768.0 - deadzone)
-            else:
-                return (raw - deadzone) / (32767.0 - deadzone)
+        return axis_scale(raw, deadzone)
 
     # Dpad Up status - returns 1 (pressed) or 0 (not pressed)
     def dpadUp(self):
-        self.refresh()
-        return int(self.reading[45:46])
+        return self.state.buttons & 1
 
     # Dpad Down status - returns 1 (pressed) or 0 (not pressed)
     def dpadDown(self):
-        self.refresh()
-        return int(self.reading[50:51])
+        return (self.state.buttons >> 1) & 1
 
     # Dpad Left status - returns 1 (pressed) or 0 (not pressed)
     def dpadLeft(self):
-        self.refresh()
-        return int(self.reading[55:56])
+        return (self.state.buttons >> 2) & 1
 
     # Dpad Right status - returns 1 (pressed) or 0 (not pressed)
     def dpadRight(self):
-        self.refresh()
-        return int(self.reading[60:61])
+        return (self.state.buttons >> 3) & 1
 
     # Back button status - returns 1 (pressed) or 0 (not pressed)
     def Back(self):
-        self.refresh()
-        return int(self.reading[68:69])
+        return (self.state.buttons >> 4) & 1
 
     # Guide button status - returns 1 (pressed) or 0 (not pressed)
     def Guide(self):
-        self.refresh()
-        return int(self.reading[76:77])
+        return (self.state.buttons >> 5) & 1
 
     # Start button status - returns 1 (pressed) or 0 (not pressed)
     def Start(self):
-        self.refresh()
-        return int(self.reading[84:85])
+        return (self.state.buttons >> 6) & 1
 
     # Left Thumbstick button status - returns 1 (pressed) or 0 (not pressed)
     def leftThumbstick(self):
-        self.refresh()
-        return int(self.reading[90:91])
+        return (self.state.buttons >> 7) & 1
 
     # Right Thumbstick button status - returns 1 (pressed) or 0 (not pressed)
     def rightThumbstick(self):
-        self.refresh()
-        return int(self.reading[95:96])
+        return (self.state.buttons >> 8) & 1
 
     # A button status - returns 1 (pressed) or 0 (not pressed)
     def A(self):
-        self.refresh()
-        return int(self.reading[100:101])
+        return (self.state.buttons >> 9) & 1
 
     # B button status - returns 1 (pressed) or 0 (not pressed)
     def B(self):
-        self.refresh()
-        return int(self.reading[104:105])
+        return (self.state.buttons >> 10) & 1
 
     # X button status - returns 1 (pressed) or 0 (not pressed)
     def X(self):
-        self.refresh()
-        return int(self.reading[108:109])
+        return (self.state.buttons >> 11) & 1
 
     # Y button status - returns 1 (pressed) or 0 (not pressed)
     def Y(self):
-        self.refresh()
-        return int(self.reading[112:113])
+        return (self.state.buttons >> 12) & 1
 
     # Left Bumper button status - returns 1 (pressed) or 0 (not pressed)
     def leftBumper(self):
-        self.refresh()
-        return int(self.reading[118:119])
+        return (self.state.buttons >> 13) & 1
 
     # Right Bumper button status - returns 1 (pressed) or 0 (not pressed)
     def rightBumper(self):
-        self.refresh()
-        return int(self.reading[123:124])
+        return (self.state.buttons >> 14) & 1
 
     # Left Trigger value scaled between 0.0 to 1.0
     def leftTrigger(self):
-        self.refresh()
-        return int(self.reading[129:132]) / 255.0
+        return self.state.triggers[0] / 255.0
 
     # Right trigger value scaled between 0.0 to 1.0
     def rightTrigger(self):
-        self.refresh()
-        return int(self.reading[136:139]) / 255.0
+        return self.state.triggers[1] / 255.0
 
     # Returns tuple containing X and Y axis values for Left stick scaled between -1.0 to 1.0
     # Usage:
     #     x,y = joy.leftStick()
-    def leftStick(self, deadzone=4000):
-        self.refresh()
+    def leftStick(self, deadzone=None):
         return (self.leftX(deadzone), self.leftY(deadzone))
 
     # Returns tuple containing X and Y axis values for Right stick scaled between -1.0 to 1.0
     # Usage:
     #     x,y = joy.rightStick()
-    def rightStick(self, deadzone=4000):
-        self.refresh()
+    def rightStick(self, deadzone=None):
         return (self.rightX(deadzone), self.rightY(deadzone))
 
     # Cleanup by ending the xboxdrv subprocess
     def close(self):
+        self.closing = True
+        self.status.close()
         try:
             # Try to terminate our specific subprocess first
             if hasattr(self, 'proc') and self.proc:
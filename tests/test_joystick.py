@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Library General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright (C) 2018 Branson Matheson
+
+import os
+import time
+
+import pytest
+
+from lib.joystate import BIT
+from lib.joystick import (EVENT, EV_ABS, EV_KEY, EV_SYN, SYN_REPORT,
+                          ABS_HAT0X, ABS_HAT0Y, EvdevJoystick)
+
+# the linux input codes an Xbox 360 controller sends through xpad
+ABS_X, ABS_Y, ABS_Z = 0x00, 0x01, 0x02
+ABS_RX, ABS_RY, ABS_RZ = 0x03, 0x04, 0x05
+BTN_A, BTN_START, BTN_DPAD_UP = 0x130, 0x13b, 0x220
+
+
+class Controller:
+    ''' writes input_event records down a FIFO to an EvdevJoystick '''
+
+    def __init__(self, path):
+        os.mkfifo(path)
+        # read-write, so neither end waits for the other to open
+        self.fd = os.open(path, os.O_RDWR)
+        self.joy = EvdevJoystick({'led': False, 'deadzone': 0}, path)
+        self.reports = 0
+
+    def send(self, *events, split=None):
+        ''' write events and a SYN_REPORT, then wait for the state '''
+        data = b''.join(EVENT.pack(0, 0, kind, code, value)
+                        for kind, code, value in events)
+        data += EVENT.pack(0, 0, EV_SYN, SYN_REPORT, 0)
+        if split is None:
+            os.write(self.fd, data)
+        else:
+            # a record cut across reads must still decode
+            os.write(self.fd, data[:split])
+            time.sleep(0.01)
+            os.write(self.fd, data[split:])
+        self.reports += 1
+        deadline = time.monotonic() + 2.0
+        while self.joy.published[0] < self.reports:
+            assert time.monotonic() < deadline, 'no state published'
+            time.sleep(0.001)
+        assert self.joy.refresh()
+        return self.joy.state
+
+    def close(self):
+        self.joy.close()
+        os.close(self.fd)
+
+
+@pytest.fixture
+def controller(tmp_path):
+    controller = Controller(str(tmp_path / 'event-joystick'))
+    yield controller
+    controller.close()
+
+
+def test_sticks(controller):
+    ''' x passes through, xpad's downward y is flipped to point up '''
+    state = controller.send(
+        (EV_ABS, ABS_X, 32767), (EV_ABS, ABS_Y, -32768),
+        (EV_ABS, ABS_RX, -32768), (EV_ABS, ABS_RY, 32767))
+    assert state.raw == (32767, 32767, -32768, -32768)
+    joy = controller.joy
+    assert joy.leftX() == 1.0
+    assert joy.leftY() == 1.0
+    assert joy.rightX() == -1.0
+    assert joy.rightY() == -1.0
+
+
+def test_triggers(controller):
+    ''' triggers keep their level and press their button bit '''
+    state = controller.send((EV_ABS, ABS_Z, 255), (EV_ABS, ABS_RZ, 0))
+    assert state.triggers == (255, 0)
+    assert state.buttons & BIT['leftTrigger']
+    assert not state.buttons & BIT['rightTrigger']
+
+
+def test_keys(controller):
+    ''' xpad key codes set and clear their buttons '''
+    state = controller.send((EV_KEY, BTN_A, 1), (EV_KEY, BTN_START, 1))
+    assert state.buttons == BIT['A'] | BIT['Start']
+    state = controller.send((EV_KEY, BTN_A, 0))
+    assert state.buttons == BIT['Start']
+
+
+def test_hat(controller):
+    ''' the hat is the d-pad, one direction per axis at a time '''
+    state = controller.send((EV_ABS, ABS_HAT0X, -1), (EV_ABS, ABS_HAT0Y, -1))
+    assert state.buttons == BIT['dpadLeft'] | BIT['dpadUp']
+    state = controller.send((EV_ABS, ABS_HAT0X, 1), (EV_ABS, ABS_HAT0Y, 0))
+    assert state.buttons == BIT['dpadRight']
+
+
+def test_dpad_buttons(controller):
+    ''' xpad's dpad_to_buttons reports the d-pad as keys '''
+    state = controller.send((EV_KEY, BTN_DPAD_UP, 1))
+    assert state.buttons == BIT['dpadUp']
+
+
+def test_split_read(controller):
+    ''' an event cut across two reads is put back together '''
+    state = controller.send((EV_ABS, ABS_X, 1234), (EV_KEY, BTN_A, 1),
+                            split=EVENT.size + 5)
+    assert state.raw[0] == 1234
+    assert state.buttons == BIT['A']
+
+
+def test_state_only_at_report(controller):
+    ''' events without a SYN_REPORT are not published '''
+    os.write(controller.fd, EVENT.pack(0, 0, EV_KEY, BTN_A, 1))
+    time.sleep(0.05)
+    assert not controller.joy.refresh()
+    state = controller.send()
+    assert state.buttons == BIT['A']
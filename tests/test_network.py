@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Library General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright (C) 2018 Branson Matheson
+
+import select
+
+import pytest
+
+from lib.config import UNIVERSE_SIZE
+from lib.listener import ArtNetInput, SacnInput, SEQUENCE_WINDOW
+from lib.output import ArtNetOutput, SacnOutput
+
+HOST = '127.0.0.1'
+
+PROTOCOLS = [
+    (ArtNetOutput, ArtNetInput, 0),
+    (SacnOutput, SacnInput, 1),
+]
+
+
+class Received:
+    ''' what a listener handed to its callback '''
+
+    def __init__(self):
+        self.frames = list()
+
+    def __call__(self, data, universe):
+        self.frames.append((universe, bytes(data)))
+
+
+def link(output_class, input_class, universe):
+    ''' an output sending universe to a listener on loopback '''
+    received = Received()
+    listener = input_class([universe], received, host=HOST, port=0)
+    port = listener.sock.getsockname()[1]
+    out = output_class(host=HOST, port=port)
+    out.prepare([universe])
+    return out, listener, received
+
+
+def deliver(listener, count=1):
+    ''' read until count more packets were taken or ignored '''
+    want = listener.packets + listener.stale + listener.ignored + count
+    while listener.packets + listener.stale + listener.ignored < want:
+        readable, _, _ = select.select([listener], [], [], 2.0)
+        assert readable, 'no packet arrived'
+        listener.ready()
+
+
+def frame(seed):
+    return bytes((seed + i * 7) % 256 for i in range(UNIVERSE_SIZE))
+
+
+@pytest.mark.parametrize('output_class, input_class, universe', PROTOCOLS)
+def test_round_trip(output_class, input_class, universe):
+    ''' a universe sent is parsed back to the same channels '''
+    out, listener, received = link(output_class, input_class, universe)
+    try:
+        for seed in (0, 1, 255):
+            assert out.send(universe, frame(seed))
+            deliver(listener)
+        assert received.frames == [
+            (universe, frame(seed)) for seed in (0, 1, 255)]
+        assert listener.stale == 0
+        assert listener.ignored == 0
+    finally:
+        listener.close()
+
+
+@pytest.mark.parametrize('output_class, input_class, universe', PROTOCOLS)
+def test_other_universe_ignored(output_class, input_class, universe):
+    ''' packets for a universe we don't route are dropped '''
+    out, listener, received = link(output_class, input_class, universe)
+    try:
+        out.prepare([universe + 1])
+        out.send(universe + 1, frame(3))
+        deliver(listener)
+        assert received.frames == []
+        assert listener.ignored == 1
+    finally:
+        listener.close()
+
+
+def test_sacn_sequence_wraps():
+    ''' E1.31 sequence numbers roll over from 255 to 0 and keep going '''
+    out, listener, received = link(SacnOutput, SacnInput, 1)
+    try:
+        sent = list()
+        for i in range(300):
+            out.send(1, frame(i))
+            sent.append(out.buffers[1][SacnOutput.SEQUENCE])
+            deliver(listener)
+        assert sent[254:258] == [255, 0, 1, 2]
+        assert len(received.frames) == 300
+        assert listener.stale == 0
+    finally:
+        listener.close()
+
+
+def test_artnet_sequence_skips_zero():
+    ''' Art-Net 0 means unsequenced, so the output wraps 255 to 1 '''
+    out = ArtNetOutput(host=HOST, port=9)
+    out.prepare([0])
+    out.sequence[0] = 254
+    assert [out.next_sequence(0) for _ in range(3)] == [255, 1, 2]
+
+
+@pytest.fixture
+def listener():
+    listener = SacnInput([1], Received(), host=HOST, port=0)
+    yield listener
+    listener.close()
+
+
+def test_stale_packets(listener):
+    ''' an older or repeated sequence is stale, a newer one is not '''
+    assert not listener.is_stale(1, 100)
+    assert listener.is_stale(1, 100)
+    assert listener.is_stale(1, 99)
+    assert listener.is_stale(1, 101 - SEQUENCE_WINDOW)
+    assert not listener.is_stale(1, 101)
+    # the stale ones did not move the sequence back
+    assert listener.sequence[1] == 101
+
+
+def test_stale_across_wrap(listener):
+    ''' just before 0 is late, just after 255 is new '''
+    assert not listener.is_stale(1, 250)
+    assert not listener.is_stale(1, 3)
+    assert listener.is_stale(1, 252)
+    assert not listener.is_stale(1, 4)
+
+
+def test_restarted_source(listener):
+    ''' a jump back past the window is a restarted source, taken '''
+    assert not listener.is_stale(1, 100)
+    assert not listener.is_stale(1, 100 - SEQUENCE_WINDOW)
+    assert listener.sequence[1] == 100 - SEQUENCE_WINDOW
+
+
+def test_universes_sequenced_apart(listener):
+    ''' each universe keeps its own sequence '''
+    assert not listener.is_stale(1, 100)
+    assert not listener.is_stale(2, 5)
+    assert not listener.is_stale(1, 101)
+    assert listener.is_stale(2, 5)